@@ -1,10 +1,145 @@
+import os
+import time
+import threading
+from datetime import datetime, timezone
 import ccxt
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
 
 app = Flask(__name__)
 CORS(app)
 
+# ---------- Metrics ----------
+REQUEST_SECONDS = Histogram("timeframes_http_request_seconds", "HTTP request latency",
+                            ["route", "method", "status"])
+UPSTREAM_SECONDS = Histogram("timeframes_upstream_fetch_seconds", "Exchange fetch_ohlcv latency")
+CACHE_LOOKUPS = Counter("timeframes_cache_lookups_total", "Candle cache lookups", ["result"])
+
+@app.before_request
+def _start_timer():
+    g.start = time.perf_counter()
+
+@app.after_request
+def _observe(response):
+    if "start" in g:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.labels(route, request.method, str(response.status_code)).observe(
+            time.perf_counter() - g.start)
+    return response
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+# upper bound (seconds) on how long a cached response may live. The last candle is still
+# forming, so keep this short; 0 caches until the candle closes (a frozen last bar)
+MAX_TTL = float(os.getenv("CANDLES_MAX_TTL", "5"))
+
+# ---------- Shared exchange client ----------
+# one client per process: markets load once and ccxt's requests.Session keeps connections alive
+_exchange = None
+_exchange_lock = threading.Lock()
+
+def get_exchange():
+    global _exchange
+    if _exchange is None:
+        with _exchange_lock:
+            if _exchange is None:
+                ex = ccxt.binance({"enableRateLimit": True})
+                ex.load_markets()
+                _exchange = ex
+    return _exchange
+
+# ---------- Candle-close-aware cache with request coalescing ----------
+_cache = {}      # (symbol, interval, limit) -> (expires_at, ohlcv)
+_inflight = {}   # key -> _Call, so a burst of identical requests makes one upstream call
+_cache_lock = threading.Lock()
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+def next_candle_close(interval, now=None):
+    """Epoch seconds at which the current `interval` candle closes."""
+    now = time.time() if now is None else now
+    if interval.endswith("M"):
+        # monthly candles close at the start of the next calendar month (UTC)
+        d = datetime.fromtimestamp(now, tz=timezone.utc)
+        return int(datetime(d.year + d.month // 12, d.month % 12 + 1, 1, tzinfo=timezone.utc).timestamp())
+    tf = ccxt.Exchange.parse_timeframe(interval)
+    # weekly candles open on Monday; the epoch was a Thursday
+    offset = 4 * 86400 if interval.endswith("w") else 0
+    return (int(now - offset) // tf + 1) * tf + offset
+
+def fetch_candles_cached(symbol, interval, limit):
+    """Returns (ohlcv, expires_at)."""
+    key = (symbol, interval, limit)
+    now = time.time()
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit and hit[0] > now:
+            CACHE_LOOKUPS.labels("hit").inc()
+            return hit[1], hit[0]
+        call = _inflight.get(key)
+        leader = call is None
+        CACHE_LOOKUPS.labels("miss" if leader else "coalesced").inc()
+        if leader:
+            call = _inflight[key] = _Call()
+
+    if not leader:
+        call.done.wait()
+        if call.error:
+            raise call.error
+        return call.result
+
+    try:
+        with UPSTREAM_SECONDS.time():
+            ohlcv = get_exchange().fetch_ohlcv(symbol, timeframe=interval, limit=limit)
+        expires = next_candle_close(interval, now)
+        if MAX_TTL:
+            expires = min(expires, now + MAX_TTL)
+        with _cache_lock:
+            _cache[key] = (expires, ohlcv)
+            # drop expired entries so the cache stays bounded by live keys
+            for k in [k for k, (exp, _) in _cache.items() if exp <= now]:
+                del _cache[k]
+        call.result = (ohlcv, expires)
+        return call.result
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _cache_lock:
+            _inflight.pop(key, None)
+        call.done.set()
+
+# ---------- Serialization ----------
+def rows_payload(ohlcv):
+    return [
+        {
+            "time": int(candle[0] / 1000),  # timestamp in seconds
+            "open": candle[1],
+            "high": candle[2],
+            "low": candle[3],
+            "close": candle[4]
+        }
+        for candle in ohlcv
+    ]
+
+def columnar_payload(ohlcv):
+    # one array per field instead of one object per candle: much smaller for large limits
+    cols = list(zip(*ohlcv)) if ohlcv else [(), (), (), (), ()]
+    return {
+        "time": [int(t / 1000) for t in cols[0]],
+        "open": list(cols[1]),
+        "high": list(cols[2]),
+        "low": list(cols[3]),
+        "close": list(cols[4])
+    }
+
 @app.route("/ping", methods=["GET"])
 def ping():
     return jsonify({"message": "Timesframes service is live ✅"})
@@ -13,25 +148,21 @@ def ping():
 def candles():
     """
     Example: /candles?symbol=BTC/USDT&interval=1h&limit=50
+    Add format=columnar for {time: [...], open: [...], ...} instead of a list of candles.
+    Responses are cached for CANDLES_MAX_TTL seconds (the last candle is still forming),
+    never past the close of the current candle.
     """
     symbol = request.args.get("symbol", "BTC/USDT")
     interval = request.args.get("interval", "1h")
     limit = int(request.args.get("limit", 50))
+    columnar = request.args.get("format") == "columnar"
 
-    exchange = ccxt.binance()
     try:
-        ohlcv = exchange.fetch_ohlcv(symbol, timeframe=interval, limit=limit)
-        data = [
-            {
-                "time": int(candle[0] / 1000),  # timestamp in seconds
-                "open": candle[1],
-                "high": candle[2],
-                "low": candle[3],
-                "close": candle[4]
-            }
-            for candle in ohlcv
-        ]
-        return jsonify({"symbol": symbol, "interval": interval, "data": data})
+        ohlcv, expires = fetch_candles_cached(symbol, interval, limit)
+        data = columnar_payload(ohlcv) if columnar else rows_payload(ohlcv)
+        resp = jsonify({"symbol": symbol, "interval": interval, "data": data})
+        resp.headers["Cache-Control"] = f"public, max-age={max(0, int(expires - time.time()))}"
+        return resp
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -0,0 +1,153 @@
+# async_fetch.py
+import os
+import time
+import random
+import asyncio
+
+from candle_store import (PAGE_LIMIT, store, ccxt_since, ccxt_store, ccxt_backfill_since,
+                          ccxt_backfill_next, ccxt_backfill_pages)
+from metrics import FETCH_RETRIES, stage
+
+# Binance spot: 1200 request weight per minute per IP (the exchange reports this in headers too)
+WEIGHT_PER_MIN = int(os.getenv("EXCHANGE_WEIGHT_PER_MIN", "1200"))
+REQUEST_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "10"))
+MAX_RETRIES = int(os.getenv("FETCH_RETRIES", "3"))
+MAX_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "50"))
+
+
+def ohlcv_weight(limit):
+    """Binance /klines request weight for a given limit."""
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` tokens per second refill up to `capacity`.
+    acquire(weight) waits until that much weight is available; a weight above `capacity`
+    could never be, so it raises ValueError instead of waiting forever.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def per_minute(cls, weight):
+        return cls(weight / 60.0, weight)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, weight=1):
+        if weight > self.capacity:
+            raise ValueError(f"weight {weight} exceeds the bucket capacity {self.capacity}")
+        async with self._lock:
+            self._refill()
+            while self.tokens < weight:
+                await asyncio.sleep((weight - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= weight
+
+
+def _retryable(exc):
+    try:
+        import ccxt
+        if isinstance(exc, (ccxt.BadSymbol, ccxt.BadRequest, ccxt.AuthenticationError)):
+            return False
+        return isinstance(exc, (ccxt.NetworkError, ccxt.ExchangeNotAvailable, asyncio.TimeoutError))
+    except ImportError:
+        return isinstance(exc, (asyncio.TimeoutError, ConnectionError))
+
+
+async def fetch_ohlcv(exchange, bucket, symbol, timeframe, since=None, limit=150,
+                      timeout=REQUEST_TIMEOUT, retries=MAX_RETRIES):
+    """One fetch_ohlcv with rate limiting, a per-request timeout and retry with full jitter."""
+    attempt = 0
+    while True:
+        await bucket.acquire(ohlcv_weight(limit))
+        try:
+            with stage("fetch"):
+                return await asyncio.wait_for(
+                    exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=limit), timeout)
+        except Exception as e:
+            attempt += 1
+            if attempt > retries or not _retryable(e):
+                raise
+            FETCH_RETRIES.inc()
+            await asyncio.sleep(random.uniform(0, min(8.0, 0.5 * 2 ** attempt)))
+
+
+async def backfill(exchange, bucket, symbol, timeframe, history, store=store, page=PAGE_LIMIT):
+    """candle_store.ccxt_backfill through the token bucket and retries."""
+    source = getattr(exchange, "id", "ccxt")
+    since = ccxt_backfill_since(source, symbol, timeframe, history, store)
+    stop = store.first_time(source, symbol, timeframe)
+    rows = []
+    for _ in range(ccxt_backfill_pages(history, page)):
+        if since is None:
+            break
+        ohlcv = await fetch_ohlcv(exchange, bucket, symbol, timeframe, since=since, limit=page)
+        rows += ohlcv
+        since = ccxt_backfill_next(ohlcv, timeframe, stop, page)
+    if rows:
+        store.merge(source, symbol, timeframe, rows)
+    return len(rows)
+
+
+def _per_tf(value, tf):
+    return value.get(tf) if isinstance(value, dict) else value
+
+
+async def fetch_stream(exchange, pairs, limit=150, bucket=None, concurrency=MAX_CONCURRENCY,
+                       store=store, history=None):
+    """
+    Fetch every (symbol, timeframe) in pairs concurrently, through the candle cache.
+    Async generator yielding (symbol, timeframe, DataFrame or Exception) in completion order,
+    so scoring can start on the first result while the rest are still in flight.
+    limit / history: a single int, or {timeframe: int} when timeframes need different windows.
+    """
+    bucket = bucket or TokenBucket.per_minute(WEIGHT_PER_MIN)
+    gate = asyncio.Semaphore(concurrency)
+    source = getattr(exchange, "id", "ccxt")
+
+    async def one(symbol, tf):
+        async with gate:
+            try:
+                n = _per_tf(limit, tf)
+                since = ccxt_since(source, symbol, tf, n, store)
+                ohlcv = await fetch_ohlcv(exchange, bucket, symbol, tf, since=since, limit=n)
+                h = _per_tf(history, tf)
+                df = ccxt_store(source, symbol, tf, ohlcv, since, n, store, h)
+                if await backfill(exchange, bucket, symbol, tf, h, store):
+                    df = store.frame(source, symbol, tf, h)
+                return symbol, tf, df
+            except Exception as e:
+                return symbol, tf, e
+
+    tasks = [asyncio.ensure_future(one(s, tf)) for s, tf in pairs]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            yield await fut
+    finally:
+        for t in tasks:
+            t.cancel()
+
+
+def async_exchange(exchange_id="binance"):
+    """
+    ccxt.async_support client with ccxt's own serial throttle off; fetch_stream's token
+    bucket does the rate limiting so requests can overlap.
+    """
+    import ccxt.async_support as ccxt_async
+    return getattr(ccxt_async, exchange_id)({"enableRateLimit": False})
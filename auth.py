@@ -2,6 +2,7 @@ import os, json, hashlib
 from datetime import datetime, timedelta
 import firebase_admin
 from firebase_admin import credentials, firestore
+from cache import TTLCache
 
 # ---------- Firestore Init ----------
 db = None
@@ -16,6 +17,21 @@ try:
 except Exception as e:
     print("❌ Firestore init failed:", e)
 
+# ---------- Key cache ----------
+# hashed key -> key doc (None = known missing). Revocation in this process invalidates at once;
+# other processes pick it up within the TTL. Misses get a shorter TTL so new keys show up fast.
+KEY_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+KEY_NEGATIVE_TTL = float(os.getenv("AUTH_NEGATIVE_TTL", "10"))
+_key_cache = TTLCache(maxsize=int(os.getenv("AUTH_CACHE_SIZE", "10000")), ttl=KEY_CACHE_TTL)
+_MISS = object()
+
+def cache_stats():
+    """Hit / miss counters for the key cache."""
+    return _key_cache.stats()
+
+def invalidate_key(key: str):
+    _key_cache.invalidate(hash_key(key))
+
 # ---------- Hash Helper ----------
 def hash_key(k: str) -> str:
     return hashlib.sha256(k.encode()).hexdigest()
@@ -40,10 +56,23 @@ def save_key_to_db(key: str, role: str = "user", days: int = None, db=db):
     doc_ref.set({
         "role": role,
         "created": datetime.utcnow().isoformat(),
-        "expiry": expiry.isoformat() if expiry else None
+        "expiry": expiry.isoformat() if expiry else None,
+        # native timestamp copy for the Firestore TTL policy (see cleanup_keys.migrate_expiry)
+        "expiresAt": expiry
     })
+    invalidate_key(key)
     print(f"✅ Key saved: {key} ({role}, expiry={expiry})")
 
+# ---------- Delete Key ----------
+def delete_key_from_db(key: str, db=db):
+    """Delete an API key; takes effect immediately for this process's cache."""
+    if not db:
+        print("⚠️ No Firestore DB connected.")
+        return
+    db.collection("keys").document(hash_key(key)).delete()
+    invalidate_key(key)
+    print(f"🗑️ Key deleted: {hash_key(key)[:8]}…")
+
 # ---------- Validate Key ----------
 def validate_key(key: str, db=db):
     """
@@ -54,11 +83,16 @@ def validate_key(key: str, db=db):
         return {"valid": False}
 
     try:
-        doc = db.collection("keys").document(hash_key(key)).get()
-        if not doc.exists:
+        h = hash_key(key)
+        data = _key_cache.get(h, _MISS)
+        if data is _MISS:
+            doc = db.collection("keys").document(h).get()
+            data = doc.to_dict() if doc.exists else None
+            _key_cache.set(h, data, ttl=KEY_CACHE_TTL if data is not None else KEY_NEGATIVE_TTL)
+        if data is None:
             return {"valid": False}
 
-        data = doc.to_dict()
+        # expiry is checked on every call, so a cached key still lapses on time
         expiry = data.get("expiry")
 
         if expiry:
@@ -0,0 +1,145 @@
+# backtest.py
+import sys
+
+import numpy as np
+import pandas as pd
+
+from signals import add_indicators
+from panel import score_arrays
+
+_SCORED = ["close", "ema_fast", "ema_slow", "sma9", "sma21", "rsi", "macd", "macd_signal",
+           "bb_upper", "bb_lower"]
+
+
+def bar_signals(df):
+    """
+    hybrid_signal's decision at every bar in one vectorized pass.
+    Row i equals what hybrid_signal(df.iloc[:i + 1]) returns: add_indicators is causal, so the
+    full-history columns at bar i are the same values a prefix would produce.
+    Returns a DataFrame (same index) with score, confidence, signal (+1/0/-1), reasons bitmask.
+    """
+    ind = add_indicators(df)
+    has_volume = "volume" in df.columns
+    cols = _SCORED + (["volume", "vol_sma"] if has_volume else [])
+    last = {c: ind[c].to_numpy(dtype=float) for c in cols}
+    prev = {c: np.r_[np.nan, v[:-1]] for c, v in last.items()}
+    n_bars = np.arange(1, len(df) + 1)
+    signal, confidence, score, reasons = score_arrays(last, prev, n_bars, has_volume)
+    return pd.DataFrame({
+        "score": score,
+        "confidence": confidence,
+        "signal": signal,
+        "reasons": reasons,
+    }, index=df.index)
+
+
+def _first_exit(high, low, start, sl, tp, side):
+    """Index of the first bar >= start that touches sl or tp, searched in doubling windows."""
+    n = len(high)
+    width = 256
+    while start < n:
+        stop = min(n, start + width)
+        h, l = high[start:stop], low[start:stop]
+        if side > 0:
+            hit_sl, hit_tp = l <= sl, h >= tp
+        else:
+            hit_sl, hit_tp = h >= sl, l <= tp
+        hits = np.flatnonzero(hit_sl | hit_tp)
+        if hits.size:
+            k = hits[0]
+            # both levels inside one bar: assume the stop filled first
+            return start + k, bool(hit_sl[k])
+        start, width = stop, width * 2
+    return None, False
+
+
+class BacktestResult:
+    __slots__ = ("signals", "trades", "equity", "stats")
+
+    def __init__(self, signals, trades, equity, stats):
+        self.signals = signals
+        self.trades = trades
+        self.equity = equity
+        self.stats = stats
+
+
+def backtest(df, sl_pct=0.01, tp_pct=0.02, fee=0.0, allow_short=True):
+    """
+    Full-history backtest of hybrid_signal with its default exits (1% SL / 2% TP from the
+    close of the signal bar). One position at a time; the next trade can open on a signal bar
+    after the exit bar. fee is charged per side as a fraction of notional.
+    The per-bar scoring is vectorized; the loop in simulate() runs once per trade, not per bar.
+    """
+    sig = bar_signals(df)
+    close = df["close"].to_numpy(dtype=float)
+    high = df["high"].to_numpy(dtype=float) if "high" in df.columns else close
+    low = df["low"].to_numpy(dtype=float) if "low" in df.columns else close
+    trades, equity = simulate(close, high, low, sig["signal"].to_numpy(), df.index,
+                              sl_pct, tp_pct, fee, allow_short)
+    return BacktestResult(sig, trades, equity, summary(trades, equity))
+
+
+def simulate(close, high, low, signal, index=None, sl_pct=0.01, tp_pct=0.02, fee=0.0,
+             allow_short=True):
+    """Trade log and equity curve for a per-bar signal array (+1 / 0 / -1)."""
+    n = len(close)
+    index = pd.RangeIndex(n) if index is None else index
+    entries = np.flatnonzero(signal > 0 if not allow_short else signal != 0)
+    equity = np.full(n, np.nan)
+    if n:
+        equity[0] = 1.0
+    trades = []
+    eq = 1.0
+    pos = 0
+    while True:
+        k = np.searchsorted(entries, pos)
+        if k >= len(entries):
+            break
+        i = entries[k]
+        side = int(signal[i])
+        entry = close[i]
+        sl = entry * (1 - side * sl_pct)
+        tp = entry * (1 + side * tp_pct)
+        j, stopped = _first_exit(high, low, i + 1, sl, tp, side)
+        if j is None:
+            j, exit_price, reason = n - 1, close[-1], "end"
+        else:
+            exit_price, reason = (sl, "stop_loss") if stopped else (tp, "take_profit")
+        ret = side * (exit_price / entry - 1) - 2 * fee
+        # mark-to-market while the trade is open, realised value on the exit bar
+        equity[i + 1:j] = eq * (1 + side * (close[i + 1:j] / entry - 1))
+        eq *= 1 + ret
+        equity[j] = eq
+        trades.append((index[i], index[j], i, j, side, entry, exit_price, reason, ret))
+        pos = j + 1
+
+    trades = pd.DataFrame(trades, columns=["entry_time", "exit_time", "entry_bar", "exit_bar",
+                                           "side", "entry", "exit", "reason", "return"])
+    return trades, pd.Series(equity, index=index).ffill()
+
+
+def summary(trades, equity):
+    rets = trades["return"].to_numpy(dtype=float)
+    gains, losses = rets[rets > 0].sum(), -rets[rets < 0].sum()
+    eq = equity.to_numpy(dtype=float)
+    drawdown = eq / np.maximum.accumulate(eq) - 1 if len(eq) else np.zeros(0)
+    held = (trades["exit_bar"] - trades["entry_bar"]).to_numpy()
+    return {
+        "trades": int(len(rets)),
+        "win_rate": float((rets > 0).mean()) if len(rets) else 0.0,
+        "total_return": float(eq[-1] - 1) if len(eq) else 0.0,
+        "max_drawdown": float(drawdown.min()) if len(eq) else 0.0,
+        "profit_factor": float(gains / losses) if losses else float("inf") if gains else 0.0,
+        "avg_return": float(rets.mean()) if len(rets) else 0.0,
+        "avg_bars_held": float(held.mean()) if len(held) else 0.0,
+        "exposure": float(held.sum() / len(eq)) if len(eq) else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    # python backtest.py candles.csv  (columns: time, open, high, low, close[, volume])
+    data = pd.read_csv(sys.argv[1], parse_dates=["time"]).set_index("time")
+    result = backtest(data)
+    print(result.trades.tail(10).to_string())
+    for k, v in result.stats.items():
+        print(f"{k:>14}: {v:.4f}" if isinstance(v, float) else f"{k:>14}: {v}")
@@ -0,0 +1,463 @@
+# bench.py
+"""
+Benchmarks for the signal pipeline hot paths, on synthetic OHLCV with no network:
+
+    python bench.py                          # everything, default sizes / widths
+    python bench.py --only hybrid_signal,fast_signal --sizes 120,10000
+    python bench.py --save bench_baseline.json
+    python bench.py --compare bench_baseline.json --tolerance 0.15
+    python bench.py --startup                # entry point import times only
+
+Each case reports the best time of --repeat runs, throughput and peak traced memory.
+--compare marks cases slower than the baseline by more than --tolerance and exits 1.
+The import.* cases (python -X importtime, in a fresh interpreter) also exit 1 when an entry
+point goes over its STARTUP_BUDGET_MS or imports one of its lazily loaded libraries eagerly.
+"""
+import os
+import io
+import sys
+import json
+import time
+import types
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+import contextlib
+
+import numpy as np
+import pandas as pd
+
+SIZES = [120, 1_000, 10_000, 100_000, 1_000_000]
+WIDTHS = [1, 10, 100]
+
+# entry point -> libraries it must not import at module load (they load on first use)
+LAZY_IMPORTS = {
+    "main": ("firebase_admin", "google.cloud.firestore", "grpc", "pandas", "numpy", "requests"),
+    "worker": ("yfinance", "requests", "firebase_admin"),
+    "signal_worker": ("ccxt", "firebase_admin", "google.cloud.firestore", "grpc"),
+    "cleanup_keys": ("firebase_admin", "google.cloud.firestore", "grpc", "pandas"),
+}
+# cumulative import time budgets (ms); pandas + numpy alone are ~400ms of the workers'
+STARTUP_BUDGET_MS = {"main": 400, "worker": 900, "signal_worker": 900, "cleanup_keys": 200}
+
+
+# ---------- synthetic data ----------
+def synthetic_ohlcv(n, seed=0, freq="1min", end=None):
+    """Random-walk OHLCV frame shaped like the fetchers' output (time column + OHLCV)."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    wick = np.abs(rng.normal(0, 0.001, (2, n)))
+    end = pd.Timestamp.now().floor(freq) if end is None else end
+    return pd.DataFrame({
+        "time": pd.date_range(end=end, periods=n, freq=freq),
+        "open": open_,
+        "high": np.maximum(open_, close) * (1 + wick[0]),
+        "low": np.minimum(open_, close) * (1 - wick[1]),
+        "close": close,
+        "volume": rng.lognormal(3, 1, n),
+    })
+
+
+def _seed(symbol):
+    return sum(map(ord, symbol))
+
+
+class FakeExchange:
+    """ccxt-shaped exchange serving synthetic candles that end at the current bar."""
+
+    id = "bench"
+
+    def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=150):
+        from candle_store import timeframe_seconds
+        tf_ms = timeframe_seconds(timeframe) * 1000
+        now = int(time.time() * 1000) // tf_ms * tf_ms
+        if since is not None:
+            limit = min(limit, (now - since) // tf_ms + 1)
+        times = now - tf_ms * np.arange(limit - 1, -1, -1)
+        rng = np.random.default_rng(_seed(symbol) + now // tf_ms)
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, limit)))
+        return np.column_stack([times, close, close * 1.001, close * 0.999, close,
+                                rng.lognormal(3, 1, limit)]).tolist()
+
+
+class FakeAsyncExchange(FakeExchange):
+    async def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=150):
+        return FakeExchange.fetch_ohlcv(self, symbol, timeframe, since, limit)
+
+    async def close(self):
+        pass
+
+
+class FakeFirestore:
+    """Just enough of a Firestore client for commit_batched; counts committed writes."""
+
+    def __init__(self):
+        self.writes = 0
+        self._ids = 0
+
+    def collection(self, name):
+        return self
+
+    def document(self, doc_id=None):
+        self._ids += 1
+        db = self
+        doc = types.SimpleNamespace(id=doc_id or f"doc{self._ids}")
+        doc.get = lambda: types.SimpleNamespace(exists=False, to_dict=lambda: None)
+
+        def set_(data):
+            db.writes += 1
+        doc.set = set_
+        return doc
+
+    def batch(self):
+        db = self
+
+        class Batch:
+            def __init__(self):
+                self.ops = 0
+
+            def set(self, ref, data):
+                self.ops += 1
+
+            def commit(self):
+                db.writes += self.ops
+        return Batch()
+
+
+def fake_download(tickers, period="5d", interval="5m", group_by=None, **kwargs):
+    """yf.download stand-in: a (ticker, field) frame for a list, a flat frame for one ticker."""
+    from candle_store import timeframe_seconds
+    step = timeframe_seconds(interval)
+    days = int(period[:-1]) if period.endswith("d") else 30
+    n = max(1, min(2000, days * 86400 // step))
+    many = isinstance(tickers, (list, tuple))
+    parts = {}
+    for sym in (tickers if many else [tickers]):
+        df = synthetic_ohlcv(n, _seed(sym), freq=f"{step}s").set_index("time")
+        df.columns = ["Open", "High", "Low", "Close", "Volume"]
+        parts[sym] = df
+    if not many:
+        return parts[tickers]
+    return pd.concat(parts, axis=1)
+
+
+@contextlib.contextmanager
+def offline_modules():
+    """
+    While importing the workers: firebase_admin, ccxt and yfinance resolve to local fakes,
+    and the candle cache points at a throwaway directory.
+    """
+    os.environ["CANDLE_CACHE_DIR"] = tempfile.mkdtemp(prefix="bench-candles-")
+    db = FakeFirestore()
+    firebase = types.ModuleType("firebase_admin")
+
+    def get_app(*args, **kwargs):
+        raise ValueError("no app")
+    firebase.get_app = get_app
+    firebase.initialize_app = lambda *a, **k: None
+    firebase.credentials = types.SimpleNamespace(Certificate=lambda *a, **k: None)
+    firebase.firestore = types.SimpleNamespace(client=lambda *a, **k: db, DELETE_FIELD=object())
+    firebase.messaging = types.SimpleNamespace()
+    ccxt = types.ModuleType("ccxt")
+    ccxt.binance = lambda *a, **k: FakeExchange()
+    yf = types.ModuleType("yfinance")
+    yf.download = fake_download
+    fakes = {"firebase_admin": firebase, "firebase_admin.credentials": firebase.credentials,
+             "firebase_admin.firestore": firebase.firestore,
+             "firebase_admin.messaging": firebase.messaging, "ccxt": ccxt, "yfinance": yf}
+    saved = {name: sys.modules.get(name) for name in fakes}
+    sys.modules.update(fakes)
+    try:
+        yield db
+    finally:
+        for name, mod in saved.items():
+            if mod is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = mod
+
+
+_workers = {}
+
+
+def load_workers():
+    """signal_worker / worker imported against the offline fakes, once per process."""
+    if not _workers:
+        with offline_modules() as db:
+            import signal_worker
+            import worker
+        _workers.update(signal_worker=signal_worker, worker=worker, db=db)
+    return _workers
+
+
+# ---------- cases ----------
+def _indicator_cases(sizes):
+    from signals import add_indicators, compute_support_resistance, hybrid_signal
+    from fast_signal import fast_signal
+    for n in sizes:
+        df = synthetic_ohlcv(n)
+        yield "add_indicators", n, "bars", n, lambda df=df: add_indicators(df)
+        yield "compute_support_resistance", n, "calls", 1, lambda df=df: compute_support_resistance(df)
+        yield "hybrid_signal", n, "bars", n, lambda df=df: hybrid_signal(df)
+        # same output as hybrid_signal (to_dict included), from contiguous arrays
+        for dtype in (np.float64, np.float32):
+            close = df["close"].to_numpy(dtype)
+            volume = df["volume"].to_numpy(dtype)
+            name = "fast_signal" if dtype is np.float64 else "fast_signal.float32"
+            yield name, n, "bars", n, lambda c=close, v=volume: fast_signal(c, v).to_dict()
+
+
+def _cycle_cases(widths):
+    w = load_workers()
+    sw, wk, db = w["signal_worker"], w["worker"], w["db"]
+    from write_buffer import WriteBuffer, firestore_writer
+
+    from signal_state import SignalState, FirestoreSnapshot
+
+    # the workers create their clients on first use, so point them at the fakes directly
+    sw.exchange = FakeExchange()
+    sw.writes = WriteBuffer(firestore_writer(db, "signals"), flush_size=100, flush_interval=0)
+    sw.state = SignalState(FirestoreSnapshot(db, "state", "signal_worker"))
+    wk.yf_download = fake_download
+    wk.pushes = WriteBuffer(wk.recorded(lambda docs: len(docs)), flush_size=50, flush_interval=0)
+
+    def signal_cycle():
+        sw.run_cycle()
+        sw.writes.flush()
+
+    def signal_cycle_async():
+        asyncio.run(sw.run_cycle_async(FakeAsyncExchange()))
+        sw.writes.flush()
+
+    for width in widths:
+        symbols = [f"S{i:04d}/USDT" for i in range(width)]
+        tickers = [f"T{i:04d}" for i in range(width)]
+        pairs = width * len(sw.timeframes)
+
+        def use(symbols=symbols):
+            sw.symbols = symbols
+        yield "signal_worker.cycle", width, "pairs", pairs, signal_cycle, use
+        yield "signal_worker.cycle_async", width, "pairs", pairs, signal_cycle_async, use
+
+        def worker_cycle(tickers=tickers):
+            wk.run_all(tickers, wk.TIMEFRAMES)
+            wk.pushes.flush()
+        yield "worker.run_all", width, "pairs", width * len(wk.TIMEFRAMES), worker_cycle, None
+
+
+# ---------- startup ----------
+def import_time(module, repeat=5):
+    """
+    Best cumulative `python -X importtime` time (s) of `import module` in a fresh interpreter,
+    and the modules that import left loaded.
+    """
+    code = f"import sys, {module}; print(' '.join(sys.modules))"
+    here = os.path.dirname(os.path.abspath(__file__))
+    best, loaded = None, set()
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=here,
+                              capture_output=True, text=True)
+        if proc.returncode:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+        for line in proc.stderr.splitlines():
+            parts = line.split("|")
+            if len(parts) == 3 and parts[2].strip() == module:
+                us = int(parts[1])
+                best = us if best is None else min(best, us)
+        loaded = set(proc.stdout.split())
+    return best / 1e6, loaded
+
+
+def run_startup(only=None, repeat=5):
+    results = []
+    for module, lazy in LAZY_IMPORTS.items():
+        name = f"import.{module}"
+        if only and name not in only:
+            continue
+        try:
+            seconds, loaded = import_time(module, repeat)
+        except RuntimeError as e:
+            print(f"❌ {name}: {e}")
+            results.append({"name": name, "size": 1, "seconds": float("inf"),
+                            "throughput": 0.0, "unit": "imports/s", "peak_mb": None,
+                            "error": str(e)})
+            continue
+        row = {
+            "name": name,
+            "size": 1,
+            "seconds": seconds,
+            "throughput": 1 / seconds if seconds else float("inf"),
+            "unit": "imports/s",
+            "peak_mb": None,
+            "budget_ms": STARTUP_BUDGET_MS.get(module),
+            "eager": sorted(m for m in lazy if m in loaded),
+        }
+        results.append(row)
+        print(_format(row), flush=True)
+    return results
+
+
+def startup_problems(results):
+    """Import cases over budget, eagerly importing a lazy library, or failing to import."""
+    problems = []
+    for row in results:
+        if not row["name"].startswith("import."):
+            continue
+        if row.get("error"):
+            problems.append(f"{row['name']} failed: {row['error']}")
+            continue
+        budget = row.get("budget_ms")
+        if budget is not None and row["seconds"] * 1000 > budget:
+            problems.append(f"{row['name']} {row['seconds'] * 1000:.0f} ms > {budget} ms budget")
+        if row.get("eager"):
+            problems.append(f"{row['name']} imports {', '.join(row['eager'])} at load")
+    return problems
+
+
+# ---------- measurement ----------
+def measure(fn, repeat=5, min_time=0.2, memory=True):
+    """Best seconds per call over `repeat` rounds (each round at least min_time), and peak bytes."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()  # warm-up: imports, caches, the workers' indicator state
+        number, elapsed = 1, 0.0
+        while True:
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time or number >= 1_000_000:
+                break
+            number *= 10 if elapsed < min_time / 10 else 2
+        best = elapsed / number
+        for _ in range(repeat - 1):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            best = min(best, (time.perf_counter() - start) / number)
+
+        peak = None
+        if memory:
+            tracemalloc.start()
+            try:
+                fn()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    return best, peak
+
+
+def run(only=None, sizes=SIZES, widths=WIDTHS, repeat=5, memory=True):
+    # first, before this process has imported any of the workers
+    results = []
+    if not only or any(name.startswith("import.") for name in only):
+        results += run_startup(only, repeat)
+
+    cases = []
+    if not only or any(not name.startswith("import.") for name in only):
+        cases += list(_indicator_cases(sizes))
+    if not only or any(name.split(".")[0] in ("signal_worker", "worker") for name in only):
+        cases += list(_cycle_cases(widths))
+
+    for case in cases:
+        name, size, unit, items, fn = case[:5]
+        setup = case[5] if len(case) > 5 else None
+        if only and name not in only:
+            continue
+        if setup:
+            setup()
+        seconds, peak = measure(fn, repeat, memory=memory)
+        row = {
+            "name": name,
+            "size": size,
+            "seconds": seconds,
+            "throughput": items / seconds if seconds else float("inf"),
+            "unit": f"{unit}/s",
+            "peak_mb": None if peak is None else peak / 2**20,
+        }
+        results.append(row)
+        print(_format(row), flush=True)
+    return results
+
+
+def _key(row):
+    return f"{row['name']}[{row['size']}]"
+
+
+def _format(row, base=None):
+    peak = "" if row["peak_mb"] is None else f"{row['peak_mb']:9.1f} MB"
+    line = (f"{_key(row):<40} {row['seconds'] * 1000:11.3f} ms "
+            f"{row['throughput']:14,.0f} {row['unit']:<8} {peak}")
+    if base:
+        line += f"   x{row['seconds'] / base['seconds']:.2f} vs baseline"
+    return line
+
+
+def compare(results, baseline, tolerance=0.10):
+    """Print each case against the baseline; returns the keys that regressed."""
+    base = {_key(r): r for r in baseline["results"]}
+    regressed = []
+    print(f"\nvs baseline ({baseline.get('created', '?')}, tolerance {tolerance:.0%}):")
+    for row in results:
+        ref = base.get(_key(row))
+        if ref is None:
+            print(_format(row) + "   (new)")
+            continue
+        slow = row["seconds"] > ref["seconds"] * (1 + tolerance)
+        print(("⚠️ " if slow else "   ") + _format(row, ref))
+        if slow:
+            regressed.append(_key(row))
+    return regressed
+
+
+def save(results, path):
+    with open(path, "w") as f:
+        json.dump({
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "results": results,
+        }, f, indent=2)
+    print(f"💾 Saved baseline to {path}")
+
+
+def _ints(text):
+    return [int(x) for x in text.split(",") if x]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Signal pipeline benchmarks")
+    parser.add_argument("--only", help="comma-separated case names, e.g. hybrid_signal,worker.run_all")
+    parser.add_argument("--startup", action="store_true", help="only the import.* cases")
+    parser.add_argument("--sizes", type=_ints, default=SIZES, help="bar counts for the indicator cases")
+    parser.add_argument("--widths", type=_ints, default=WIDTHS, help="symbols per cycle")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--save", help="write results as a baseline JSON")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    only = set(args.only.split(",")) if args.only else None
+    if args.startup:
+        only = (only or set()) | {f"import.{m}" for m in LAZY_IMPORTS}
+    results = run(only, args.sizes, args.widths, args.repeat, not args.no_memory)
+    if args.save:
+        save(results, args.save)
+    failed = False
+    if args.compare:
+        with open(args.compare) as f:
+            regressed = compare(results, json.load(f), args.tolerance)
+        if regressed:
+            print(f"\n❌ {len(regressed)} regression(s): {', '.join(regressed)}")
+            failed = True
+    problems = startup_problems(results)
+    for problem in problems:
+        print(f"❌ {problem}")
+    if failed or problems:
+        sys.exit(1)
@@ -1,8 +1,14 @@
 # brokers.py
 import os
 import time
-from datetime import datetime
-from typing import Dict, Any
+import json
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from cache import TTLCache
 
 # optional imports (may not be installed in environment)
 try:
@@ -19,7 +25,118 @@ except Exception:
 def _now_iso():
     return datetime.utcnow().isoformat()
 
+# ---------- Client pool ----------
+# authenticated clients are reused so their requests.Session keeps TLS connections alive
+CLIENT_TTL = float(os.getenv("BROKER_CLIENT_TTL", str(6 * 3600)))
+CLIENT_POOL_SIZE = int(os.getenv("BROKER_CLIENT_POOL_SIZE", "256"))
+
+# error text brokers use for expired / revoked sessions; a false positive only costs a rebuild
+_AUTH_MARKERS = ("token", "session", "jwt", "unauthori", "forbidden", "ag8001", "ag8002", "ag8003")
+
+def _kite_token_expiry(now=None):
+    """Kite access tokens are invalidated daily at 06:00 IST (00:30 UTC)."""
+    now = now or datetime.now(timezone.utc)
+    expiry = now.replace(hour=0, minute=30, second=0, microsecond=0)
+    if expiry <= now:
+        expiry += timedelta(days=1)
+    return expiry.timestamp()
+
+def _jwt_expiry(token):
+    """exp claim of a JWT (epoch seconds), or None when it can't be read."""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except Exception:
+        return None
+
+def is_auth_error(exc_or_response) -> bool:
+    """True for exceptions / error responses that mean the session is no longer valid."""
+    if isinstance(exc_or_response, dict):
+        if exc_or_response.get("status") is not False:
+            return False
+        text = f"{exc_or_response.get('errorcode', '')} {exc_or_response.get('message', '')}"
+    else:
+        text = f"{type(exc_or_response).__name__} {exc_or_response}"
+    text = text.lower()
+    return any(m in text for m in _AUTH_MARKERS)
+
+class ClientPool:
+    """
+    Thread-safe pool of authenticated broker clients keyed by (broker, api_key, token).
+    Entries live until the token expires (capped at CLIENT_TTL) and are evicted on auth errors.
+    Construction happens outside the pool lock, once per key even under concurrent callers.
+    """
+
+    def __init__(self, maxsize=CLIENT_POOL_SIZE, ttl=CLIENT_TTL):
+        self._clients = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._building: Dict[Tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.ttl = ttl
+        self.created = 0
+        self.evicted = 0
+
+    def get(self, key: Tuple, factory: Callable[[], Any], expires_at: float = None):
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+        with self._lock:
+            build_lock = self._building.setdefault(key, threading.Lock())
+        try:
+            with build_lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = factory()
+                    ttl = self.ttl
+                    if expires_at is not None:
+                        ttl = min(ttl, expires_at - time.time())
+                    if ttl > 0:
+                        self._clients.set(key, client, ttl=ttl)
+                    with self._lock:
+                        self.created += 1
+            return client
+        finally:
+            with self._lock:
+                self._building.pop(key, None)
+
+    def evict(self, key: Tuple):
+        self._clients.invalidate(key)
+        with self._lock:
+            self.evicted += 1
+
+    def call(self, key: Tuple, factory: Callable[[], Any], fn: Callable[[Any], Any],
+             expires_at: float = None):
+        """fn(client) with a pooled client; an auth failure evicts it before re-raising."""
+        client = self.get(key, factory, expires_at)
+        try:
+            res = fn(client)
+        except Exception as e:
+            if is_auth_error(e):
+                self.evict(key)
+            raise
+        if is_auth_error(res):
+            self.evict(key)
+        return res
+
+    def clear(self):
+        self._clients.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._clients.stats(), "created": self.created, "evicted": self.evicted}
+
+pool = ClientPool()
+
 # ---------- Zerodha helpers ----------
+def _kite(api_key: str, access_token: str):
+    if KiteConnect is None:
+        raise RuntimeError("kiteconnect library not installed")
+
+    def build():
+        kite = KiteConnect(api_key=api_key)
+        kite.set_access_token(access_token)
+        return kite
+    return ("zerodha", api_key, access_token), build, _kite_token_expiry()
+
 def zerodha_create_session(api_key: str, request_token: str, api_secret: str = None) -> Dict[str, Any]:
     """
     Exchange request_token for access_token and return session info dict.
@@ -43,12 +160,10 @@ def zerodha_get_balance(api_key: str, access_token: str) -> Dict[str, Any]:
     Fetch usable balance for Zerodha user.
     Returns dict {balance: float, currency: 'INR', raw: {...}}
     """
-    if KiteConnect is None:
-        raise RuntimeError("kiteconnect library not installed")
-    kite = KiteConnect(api_key=api_key)
-    kite.set_access_token(access_token)
+    key, build, expires = _kite(api_key, access_token)
     # margins returns dict per segment; using equity/net for demonstration
-    margins = kite.margins("equity")  # may raise if token expired
+    # may raise if token expired (the pooled client is then evicted)
+    margins = pool.call(key, build, lambda kite: kite.margins("equity"), expires)
     # margins shape depends on Kite API — attempt to pull useful value
     balance = None
     if isinstance(margins, dict):
@@ -70,15 +185,26 @@ def zerodha_place_order(api_key: str, access_token: str, order_payload: dict) ->
     Place an order via KiteConnect. order_payload is per KiteConnect's place_order args.
     Returns Kite response dict.
     """
-    if KiteConnect is None:
-        raise RuntimeError("kiteconnect library not installed")
-    kite = KiteConnect(api_key=api_key)
-    kite.set_access_token(access_token)
-    res = kite.place_order(**order_payload)
+    key, build, expires = _kite(api_key, access_token)
+    res = pool.call(key, build, lambda kite: kite.place_order(**order_payload), expires)
     return {"result": res, "time": _now_iso()}
 
 
 # ---------- AngelOne (SmartAPI) helpers ----------
+def _smart(api_key: str, jwt_token: str):
+    if SmartConnect is None:
+        raise RuntimeError("smartapi-python library not installed")
+
+    def build():
+        smart = SmartConnect(api_key=api_key)
+        # some smartapi libs expect set_jwt_token or similar — check library docs
+        try:
+            smart.session = {"jwtToken": jwt_token}
+        except Exception:
+            pass
+        return smart
+    return ("angelone", api_key, jwt_token), build, _jwt_expiry(jwt_token)
+
 def angel_create_session(api_key: str, client_id: str, password: str, totp: str = None) -> Dict[str, Any]:
     """
     Create session with AngelOne SmartConnect.
@@ -97,16 +223,10 @@ def angel_get_balance(api_key: str, jwt_token: str) -> Dict[str, Any]:
     Use SmartConnect instance to fetch RMS/margin balance (API specifics vary).
     Expectation: smartApi.rmsLimit() returns margin/balance.
     """
-    if SmartConnect is None:
-        raise RuntimeError("smartapi-python library not installed")
-    smart = SmartConnect(api_key=api_key)
-    # some smartapi libs expect set_jwt_token or similar — check library docs
+    key, build, expires = _smart(api_key, jwt_token)
     try:
-        smart.session = {"jwtToken": jwt_token}
-    except Exception:
-        pass
-    try:
-        rms = smart.rmsLimit()  # method name may differ; adjust if needed
+        # method name may differ; adjust if needed
+        rms = pool.call(key, build, lambda smart: smart.rmsLimit(), expires)
     except Exception:
         # fallback: call get profile or funds endpoint
         rms = {}
@@ -126,14 +246,9 @@ def angel_place_order(api_key: str, jwt_token: str, order_payload: dict) -> dict
     """
     Place order via AngelOne API wrapper. Signature depends on library.
     """
-    if SmartConnect is None:
-        raise RuntimeError("smartapi-python library not installed")
-    smart = SmartConnect(api_key=api_key)
-    try:
-        smart.session = {"jwtToken": jwt_token}
-    except Exception:
-        pass
-    res = smart.placeOrder(order_payload) if hasattr(smart, "placeOrder") else {"unsupported": True}
+    key, build, expires = _smart(api_key, jwt_token)
+    res = pool.call(key, build, lambda smart: smart.placeOrder(order_payload)
+                    if hasattr(smart, "placeOrder") else {"unsupported": True}, expires)
     return {"result": res, "time": _now_iso()}
 
 
@@ -164,21 +279,120 @@ def get_balance_for_user_broker(broker_key: str, creds: dict) -> dict:
         return {"balance": float(balance or 0.0), "currency": "USDT", "raw": {}}
     return {"balance": "Unsupported Broker"}
 
+class BrokerRejected(RuntimeError):
+    """The order was refused before it was sent (no session, unsupported broker)."""
+
+
 def place_order_for_user_broker(broker_key: str, creds: dict, order_payload: dict) -> dict:
     bk = broker_key.lower()
+    try:
+        return _place_order(bk, creds, order_payload)
+    finally:
+        # the order moves funds: the next balance read should hit the broker. Dropped once the
+        # call returns, so a balance read racing the order can't cache the pre-order value
+        invalidate_balance(bk, creds)
+
+
+def _place_order(bk: str, creds: dict, order_payload: dict) -> dict:
     if bk == "zerodha":
         api_key = creds.get("api_key")
         access_token = creds.get("access_token")
         if not api_key or not access_token:
-            raise RuntimeError("Zerodha not connected")
+            raise BrokerRejected("Zerodha not connected")
         return zerodha_place_order(api_key, access_token, order_payload)
     if bk == "angelone":
         api_key = creds.get("api_key")
         jwt_token = creds.get("jwt_token") or creds.get("access_token")
         if not api_key or not jwt_token:
-            raise RuntimeError("AngelOne not connected")
+            raise BrokerRejected("AngelOne not connected")
         return angel_place_order(api_key, jwt_token, order_payload)
     if bk in ("binance", "exness"):
         # implement ccxt calls from main.py side (or here)
         return {"result": "ccxt-order-placeholder", "time": _now_iso()}
-    raise RuntimeError("Unsupported broker")
+    raise BrokerRejected("Unsupported broker")
+
+
+# ---------- Bulk balances ----------
+BALANCE_CACHE_TTL = float(os.getenv("BALANCE_CACHE_TTL", "10"))
+BALANCE_WORKERS = int(os.getenv("BALANCE_WORKERS", "16"))
+# concurrent requests per broker (Kite allows ~10 req/s per app, SmartAPI is stricter)
+BROKER_CONCURRENCY = {"zerodha": 8, "angelone": 4}
+DEFAULT_BROKER_CONCURRENCY = 4
+
+_balance_cache = TTLCache(maxsize=4096, ttl=BALANCE_CACHE_TTL)
+_broker_gates: Dict[str, threading.Semaphore] = {}
+_balance_executor = None
+_balance_lock = threading.Lock()
+
+def _balance_key(bk: str, creds: dict) -> Tuple:
+    token = creds.get("access_token")
+    if bk == "angelone":
+        token = creds.get("jwt_token") or token
+    return (bk, creds.get("api_key"), token, creds.get("balance"))
+
+def invalidate_balance(broker_key: str, creds: dict):
+    _balance_cache.invalidate(_balance_key(broker_key.lower(), creds or {}))
+
+def _executor() -> ThreadPoolExecutor:
+    # created on first use so a preloaded gunicorn app creates it after fork
+    global _balance_executor
+    with _balance_lock:
+        if _balance_executor is None:
+            _balance_executor = ThreadPoolExecutor(max_workers=BALANCE_WORKERS,
+                                                   thread_name_prefix="balance")
+        return _balance_executor
+
+def _gate(bk: str) -> threading.Semaphore:
+    with _balance_lock:
+        if bk not in _broker_gates:
+            _broker_gates[bk] = threading.Semaphore(BROKER_CONCURRENCY.get(bk, DEFAULT_BROKER_CONCURRENCY))
+        return _broker_gates[bk]
+
+def _fetch_balance(bk: str, creds: dict, key: Tuple) -> dict:
+    with _gate(bk):
+        res = get_balance_for_user_broker(bk, creds)
+    # only real balances are cached; "Connect Broker" style placeholders cost nothing to recompute
+    if isinstance(res.get("balance"), float):
+        _balance_cache.set(key, res)
+    return res
+
+def get_balances(entries: Iterable, use_cache: bool = True, timeout: float = None) -> List[dict]:
+    """
+    Balances for many (user_id, broker_key, creds) entries, fetched concurrently.
+    Results come back in input order as get_balance_for_user_broker's dict plus "user",
+    "broker" and "cached"; a failed entry gets {"user", "broker", "error"} instead of
+    failing the batch. Identical credentials in one batch are fetched once, and results are
+    reused for BALANCE_CACHE_TTL seconds.
+    """
+    entries = list(entries)
+    out: List[dict] = [None] * len(entries)
+    pending: Dict[Tuple, Any] = {}
+    slots: List[Tuple[int, Tuple]] = []
+
+    for i, (user, broker_key, creds) in enumerate(entries):
+        bk = (broker_key or "").lower()
+        creds = creds or {}
+        key = _balance_key(bk, creds)
+        hit = _balance_cache.get(key) if use_cache else None
+        if hit is not None:
+            out[i] = {**hit, "user": user, "broker": bk, "cached": True}
+            continue
+        if key not in pending:
+            pending[key] = _executor().submit(_fetch_balance, bk, creds, key)
+        slots.append((i, key))
+
+    if pending:
+        wait(pending.values(), timeout=timeout)
+    for i, key in slots:
+        user, broker_key = entries[i][0], (entries[i][1] or "").lower()
+        fut = pending[key]
+        if not fut.done():
+            out[i] = {"user": user, "broker": broker_key, "error": "timeout"}
+        elif fut.exception() is not None:
+            out[i] = {"user": user, "broker": broker_key, "error": str(fut.exception())}
+        else:
+            out[i] = {**fut.result(), "user": user, "broker": broker_key, "cached": False}
+    return out
+
+def balance_cache_stats() -> Dict[str, int]:
+    return _balance_cache.stats()
@@ -0,0 +1,309 @@
+# candle_store.py
+import os
+import re
+import time
+import threading
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = os.getenv("CANDLE_CACHE_DIR", os.path.join("output", "candles"))
+# 10000 x 1m covers 150 x 1h, so higher timeframes can be resampled from the 1m cache
+MAX_BARS = int(os.getenv("CANDLE_CACHE_MAX_BARS", "10000"))
+
+COLUMNS = ["time", "open", "high", "low", "close", "volume"]
+# bars per backfill request (Binance's /klines maximum)
+PAGE_LIMIT = 1000
+
+_UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+# yfinance only accepts these periods; pick the smallest that covers the gap
+_YF_PERIODS = [("1d", 1), ("5d", 5), ("1mo", 30), ("3mo", 90), ("6mo", 180),
+               ("1y", 365), ("2y", 730), ("5y", 1825), ("10y", 3650)]
+
+
+def timeframe_seconds(tf):
+    """'1m' -> 60, '4h' -> 14400, '1d' -> 86400"""
+    m = re.fullmatch(r"(\d+)([smhdw])", tf)
+    if not m:
+        raise ValueError(f"unsupported timeframe: {tf}")
+    return int(m.group(1)) * _UNIT_SECONDS[m.group(2)]
+
+
+class CandleStore:
+    """
+    Persistent OHLCV cache keyed by (source, symbol, timeframe).
+
+    Each key is one .npy file holding an (n, 6) float64 array [time_ms, o, h, l, c, v],
+    memory-mapped on read. merge() writes new candles over the tail (the last stored bar
+    may still be forming, so anything from the first new timestamp on is replaced).
+    frame() is the warm-read path: a ready DataFrame kept in memory per key.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bars=MAX_BARS):
+        self.root = root
+        self.max_bars = max_bars
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def path(self, source, symbol, timeframe):
+        safe = re.sub(r"[^A-Za-z0-9._=^-]", "_", symbol)
+        return os.path.join(self.root, source, safe, f"{timeframe}.npy")
+
+    def load(self, source, symbol, timeframe):
+        p = self.path(source, symbol, timeframe)
+        if not os.path.exists(p):
+            return None
+        try:
+            return np.load(p, mmap_mode="r")
+        except Exception as e:
+            print(f"⚠️ Corrupt candle cache {p}: {e}")
+            return None
+
+    def last_time(self, source, symbol, timeframe):
+        """Timestamp (ms) of the last stored bar, or None."""
+        arr = self.load(source, symbol, timeframe)
+        if arr is None or not len(arr):
+            return None
+        return int(arr[-1, 0])
+
+    def first_time(self, source, symbol, timeframe):
+        """Timestamp (ms) of the oldest stored bar, or None."""
+        arr = self.load(source, symbol, timeframe)
+        if arr is None or not len(arr):
+            return None
+        return int(arr[0, 0])
+
+    def merge(self, source, symbol, timeframe, rows, replace=False):
+        """
+        rows: iterable of [time_ms, open, high, low, close, volume] in time order.
+        Stored bars inside the rows' time span are replaced; those before and after it are kept
+        (a backfill page slots in before the stored history).
+        replace=True drops the stored history (used when the fetch could not reach back to it).
+        Returns the merged array.
+        """
+        new = np.asarray(rows, dtype=float).reshape(-1, len(COLUMNS))
+        key = (source, symbol, timeframe)
+        with self._lock:
+            old = None if replace else self.load(*key)
+            if old is not None and len(new):
+                before = old[old[:, 0] < new[0, 0]]
+                after = old[old[:, 0] > new[-1, 0]]
+                merged = np.concatenate([before, new, after])
+            elif old is not None:
+                merged = np.array(old)
+            else:
+                merged = new
+            merged = merged[-self.max_bars:]
+            p = self.path(*key)
+            os.makedirs(os.path.dirname(p), exist_ok=True)
+            tmp = p + ".tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, merged)
+            os.replace(tmp, p)
+            self._frames.pop(key, None)
+        return merged
+
+    def frame(self, source, symbol, timeframe, limit=None):
+        """DataFrame with time (datetime) + OHLCV columns; cached in memory until the next merge."""
+        key = (source, symbol, timeframe)
+        df = self._frames.get(key)
+        if df is None:
+            arr = self.load(*key)
+            if arr is None:
+                return None
+            df = pd.DataFrame({c: np.asarray(arr[:, i]) for i, c in enumerate(COLUMNS)})
+            df["time"] = pd.to_datetime(df["time"].astype("int64"), unit="ms")
+            self._frames[key] = df
+        if limit:
+            df = df.iloc[-limit:].reset_index(drop=True)
+        return df
+
+
+store = CandleStore()
+
+
+# ---------- ccxt ----------
+def ccxt_since(source, symbol, timeframe, limit=150, store=store):
+    """
+    since= for a delta fetch: the last stored bar (it may still be forming), or None when the
+    cache is empty or too stale for one page of `limit` candles to close the gap.
+    """
+    last = store.last_time(source, symbol, timeframe)
+    if last is None:
+        return None
+    tf_ms = timeframe_seconds(timeframe) * 1000
+    now_ms = int(time.time() * 1000)
+    return last if (now_ms - last) // tf_ms < limit else None
+
+
+def ccxt_store(source, symbol, timeframe, ohlcv, since, limit=150, store=store, history=None):
+    """
+    Merge a fetch_ohlcv result planned with ccxt_since and return the warm frame
+    (the last `history` bars of the cache, default `limit`).
+    """
+    store.merge(source, symbol, timeframe, ohlcv, replace=since is None)
+    return store.frame(source, symbol, timeframe, history or limit)
+
+
+def ccxt_backfill_since(source, symbol, timeframe, history, store=store):
+    """
+    since= of the first backfill page when the cache does not reach `history` bars back from
+    now (cold start, short uptime, cache lost on restart), else None. The cache only grows
+    forward by itself, so without this a long history would take days of uptime to build.
+    """
+    if not history:
+        return None
+    tf_ms = timeframe_seconds(timeframe) * 1000
+    want = int(time.time() * 1000) // tf_ms * tf_ms - (history - 1) * tf_ms
+    first = store.first_time(source, symbol, timeframe)
+    return None if first is not None and first <= want else want
+
+
+def ccxt_backfill_next(ohlcv, timeframe, stop, page=PAGE_LIMIT):
+    """since= of the next backfill page, or None once the pages reach `stop` (ms) or now."""
+    if not ohlcv or len(ohlcv) < page:
+        return None
+    nxt = int(ohlcv[-1][0]) + timeframe_seconds(timeframe) * 1000
+    return None if stop is not None and nxt >= stop else nxt
+
+
+def ccxt_backfill_pages(history, page=PAGE_LIMIT):
+    # upper bound on pages, in case an exchange ignores since=
+    return history // page + 2
+
+
+def ccxt_backfill(exchange, symbol, timeframe, history, store=store, page=PAGE_LIMIT):
+    """Page forward from `history` bars ago up to the oldest cached bar; returns the bars added."""
+    source = getattr(exchange, "id", "ccxt")
+    since = ccxt_backfill_since(source, symbol, timeframe, history, store)
+    stop = store.first_time(source, symbol, timeframe)
+    rows = []
+    for _ in range(ccxt_backfill_pages(history, page)):
+        if since is None:
+            break
+        ohlcv = exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=page)
+        rows += ohlcv
+        since = ccxt_backfill_next(ohlcv, timeframe, stop, page)
+    if rows:
+        store.merge(source, symbol, timeframe, rows)
+    return len(rows)
+
+
+def ccxt_fetch(exchange, symbol, timeframe, limit=150, store=store, history=None):
+    """
+    fetch_ohlcv through the cache: only candles from the last stored bar onwards are requested
+    (since=), unless the cache is empty or too stale for one page to close the gap. With
+    `history`, a cache that doesn't reach that far back is backfilled page by page first.
+    """
+    source = getattr(exchange, "id", "ccxt")
+    since = ccxt_since(source, symbol, timeframe, limit, store)
+    ohlcv = exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
+    store.merge(source, symbol, timeframe, ohlcv, replace=since is None)
+    ccxt_backfill(exchange, symbol, timeframe, history, store)
+    return store.frame(source, symbol, timeframe, history or limit)
+
+
+# ---------- yfinance ----------
+def yf_period_since(last_ms, default="5d"):
+    """
+    Smallest yfinance period string that still reaches back to last_ms, capped at default.
+    Returns None when last_ms is missing or older than the default window.
+    """
+    if last_ms is None:
+        return None
+    days = (time.time() * 1000 - last_ms) / 86400000.0
+    for period, span in _YF_PERIODS:
+        if days < span:
+            return period
+        if period == default:
+            break
+    return None
+
+
+def yf_rows(df):
+    """yf.download frame (DatetimeIndex, Open/High/...) -> [time_ms, o, h, l, c, v] rows"""
+    if df is None or df.empty:
+        return np.empty((0, len(COLUMNS)))
+    if isinstance(df.columns, pd.MultiIndex):
+        # single ticker downloads still come back as (field, ticker) in newer yfinance
+        df = df.droplevel(-1, axis=1)
+    idx = pd.DatetimeIndex(df.index)
+    if idx.tz is not None:
+        idx = idx.tz_convert("UTC").tz_localize(None)
+    out = np.empty((len(df), len(COLUMNS)))
+    out[:, 0] = idx.as_unit("ms").asi8
+    for i, col in enumerate(["Open", "High", "Low", "Close", "Volume"], start=1):
+        out[:, i] = df[col].to_numpy(dtype=float) if col in df.columns else np.nan
+    return out
+
+
+def yf_fetch(download, symbol, interval, limit=120, period="5d", store=store):
+    """
+    yf.download through the cache. download is yf.download (passed in so yfinance stays
+    an import of the caller). The period is narrowed to just cover the gap since the last bar.
+    """
+    last = store.last_time("yfinance", symbol, interval)
+    narrowed = yf_period_since(last, default=period)
+    df = download(tickers=symbol, period=narrowed or period, interval=interval, progress=False)
+    store.merge("yfinance", symbol, interval, yf_rows(df), replace=narrowed is None)
+    return store.frame("yfinance", symbol, interval, limit)
+
+
+def _drop_gaps(df):
+    return df.dropna(subset=["Close"]) if "Close" in df.columns else df.dropna(how="all")
+
+
+def yf_split(df, symbols):
+    """
+    Split a multi-ticker yf.download frame (group_by="ticker") into {symbol: frame}.
+    Tickers trade different sessions, so each slice drops the rows of the shared index it has
+    no close for;
+    a symbol missing from the result or with no rows left maps to None.
+    """
+    out = {sym: None for sym in symbols}
+    if df is None or df.empty:
+        return out
+    if not isinstance(df.columns, pd.MultiIndex):
+        if len(symbols) == 1:
+            out[symbols[0]] = _drop_gaps(df)
+        return out
+    level = 0 if set(symbols) & set(df.columns.get_level_values(0)) else 1
+    present = set(df.columns.get_level_values(level))
+    for sym in symbols:
+        if sym not in present:
+            continue
+        sub = _drop_gaps(df.xs(sym, axis=1, level=level))
+        out[sym] = sub if not sub.empty else None
+    return out
+
+
+def yf_fetch_batch(download, symbols, interval, limit=120, period="5d", threads=True, store=store):
+    """
+    yf.download for many tickers of one interval, through the cache.
+    Symbols are grouped by the period their cache gap needs, so a warm cache is usually one
+    small request per interval. Returns {symbol: DataFrame or Exception}; a bad ticker only
+    fails its own entry.
+    """
+    groups = {}
+    for sym in symbols:
+        narrowed = yf_period_since(store.last_time("yfinance", sym, interval), default=period)
+        groups.setdefault(narrowed, []).append(sym)
+
+    out = {}
+    for narrowed, group in groups.items():
+        try:
+            df = download(tickers=group, period=narrowed or period, interval=interval,
+                          group_by="ticker", threads=threads, progress=False)
+        except Exception as e:
+            out.update({sym: e for sym in group})
+            continue
+        for sym, sub in yf_split(df, group).items():
+            try:
+                if sub is None:
+                    raise ValueError(f"no data for {sym} {interval}")
+                store.merge("yfinance", sym, interval, yf_rows(sub), replace=narrowed is None)
+                out[sym] = store.frame("yfinance", sym, interval, limit)
+            except Exception as e:
+                out[sym] = e
+    return out
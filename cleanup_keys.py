@@ -1,26 +1,74 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
+import time
+import argparse
 from datetime import datetime
+from write_buffer import FIRESTORE_BATCH_LIMIT
+from firebase_app import db  # firebase is initialised on the first query
 
-# init firebase
-cred = credentials.Certificate("serviceAccount.json")
-firebase_admin.initialize_app(cred)
-db = firestore.client()
+def _pages(query, field, page_size):
+    # cursor pagination: each page starts after the last doc of the previous one. A page is
+    # written as one batch, so it can't hold more than Firestore's batch limit
+    page_size = max(1, min(page_size, FIRESTORE_BATCH_LIMIT))
+    last = None
+    while True:
+        q = query.order_by(field).limit(page_size)
+        if last is not None:
+            q = q.start_after(last)
+        docs = q.get()
+        if not docs:
+            return
+        yield docs
+        if len(docs) < page_size:
+            return
+        last = docs[-1]
 
-def cleanup():
-    snap = db.collection("keys").get()
+def cleanup(page_size=FIRESTORE_BATCH_LIMIT):
+    """
+    Delete expired keys. Only docs matching the server-side range query expiry < now are read
+    (ISO strings sort chronologically; keys without expiry never match), one batched
+    delete per page.
+    """
+    start = time.monotonic()
+    now = datetime.utcnow().isoformat()
+    keys = db.collection("keys")
+    count = pages = 0
+    for docs in _pages(keys.where("expiry", "<", now), "expiry", page_size):
+        batch = db.batch()
+        for doc in docs:
+            batch.delete(doc.reference)
+        batch.commit()
+        count += len(docs)
+        pages += 1
+    elapsed = time.monotonic() - start
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"Deleted {count} expired keys in {pages} batches, {elapsed:.2f}s ({rate:.0f} keys/s)")
+    return count
+
+def migrate_expiry(page_size=FIRESTORE_BATCH_LIMIT):
+    """
+    One-off: copy the ISO `expiry` string into a native timestamp `expiresAt`, so a Firestore
+    TTL policy can expire keys on its own:
+      gcloud firestore fields ttls update expiresAt --collection-group=keys --enable-ttl
+    """
+    keys = db.collection("keys")
     count = 0
-    for doc in snap:
-        data = doc.to_dict()
-        exp = data.get("expiry")
-        if exp:
+    for docs in _pages(keys.where("expiry", ">", ""), "expiry", page_size):
+        batch = db.batch()
+        for doc in docs:
             try:
-                if datetime.utcnow() > datetime.fromisoformat(exp):
-                    db.collection("keys").document(doc.id).delete()
-                    count += 1
+                batch.update(doc.reference, {"expiresAt": datetime.fromisoformat(doc.get("expiry"))})
+                count += 1
             except Exception as e:
-                print("skip", e)
-    print("Deleted", count, "expired keys")
+                print("skip", doc.id, e)
+        batch.commit()
+    print("Migrated", count, "keys to expiresAt")
+    return count
 
 if __name__ == "__main__":
-    cleanup()
+    parser = argparse.ArgumentParser(description="Delete expired API keys")
+    parser.add_argument("--page-size", type=int, default=FIRESTORE_BATCH_LIMIT,
+                        help=f"docs per page / batch (at most {FIRESTORE_BATCH_LIMIT})")
+    parser.add_argument("--migrate", action="store_true", help="backfill expiresAt timestamps first")
+    args = parser.parse_args()
+    if args.migrate:
+        migrate_expiry(args.page_size)
+    cleanup(args.page_size)
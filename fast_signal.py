@@ -0,0 +1,167 @@
+# fast_signal.py
+"""
+hybrid_signal without pandas: close / volume arrays in, a compact SignalResult out.
+
+Only the values the scoring rules read are computed. The EMAs run over the tail of the series
+that can still move them (older bars weigh less than the dtype's epsilon) as one cumsum each,
+the rolling means over their last two windows only. With float64 input the scores match
+hybrid_signal; float32 needs a shorter tail and half the memory, but may flip near-ties.
+
+    res = fast_signal(df["close"].to_numpy(), df["volume"].to_numpy())
+    res.label, res.confidence   # plain attributes
+    res.to_dict()               # hybrid_signal's dict; support / resistance computed here
+"""
+import math
+from datetime import datetime
+
+import numpy as np
+
+from panel import INSUFFICIENT_DATA, SIGNAL_LABELS, reason_strings, score_arrays, signal_dict
+from pivots import levels_from_closes
+
+# hybrid_signal's smoothing factors as pandas ewm alphas
+EMA_FAST = 2.0 / 13.0     # span 12
+EMA_SLOW = 2.0 / 27.0     # span 26
+MACD_SIGNAL = 2.0 / 10.0  # span 9
+RSI_ALPHA = 1.0 / 14.0    # com 13
+LEVELS_LOOKBACK = 120     # compute_support_resistance's default
+
+
+def _memory(alpha, dtype):
+    # bars after which an observation's weight in the EMA is below the dtype's epsilon
+    return math.ceil(math.log(np.finfo(dtype).eps) / math.log(1.0 - alpha))
+
+
+def tail_length(dtype=np.float64):
+    """Bars of history that can still change any value hybrid_signal scores."""
+    return max(_memory(EMA_SLOW, dtype) + _memory(MACD_SIGNAL, dtype),
+               _memory(RSI_ALPHA, dtype) + 1, 22)
+
+
+_TAIL = {np.dtype(t): tail_length(t) for t in (np.float32, np.float64)}
+
+
+def _ewm(x, alpha):
+    """pandas ewm(alpha=alpha, adjust=False).mean() of a finite 1-D array, without a loop."""
+    # y_t = d^t * (x_0 + sum_{0<k<=t} alpha * x_k / d^k) with d = 1 - alpha; the tail length
+    # keeps d^-t far from overflowing
+    grow = (1.0 - alpha) ** -np.arange(len(x), dtype=x.dtype)
+    z = np.cumsum(alpha * x * grow)
+    z += (1.0 - alpha) * x[0]
+    return z / grow
+
+
+def _last2(x, size, fn):
+    # fn over the size-bar windows ending at the previous and at the last bar (rolling(size))
+    n = len(x)
+    nan = x.dtype.type(np.nan)
+    prev = fn(x[n - size - 1:n - 1]) if n > size else nan
+    last = fn(x[n - size:]) if n >= size else nan
+    return prev, last
+
+
+def _std(w):
+    return w.std(ddof=1)
+
+
+class SignalResult:
+    """
+    fast_signal's output.
+    signal: +1 BUY / 0 HOLD / -1 SELL; reasons: panel's reason bitmask;
+    last: indicator values of the scored bar; closes: the tail used for support / resistance
+    """
+    __slots__ = ("signal", "confidence", "score", "reasons", "last", "closes", "at")
+
+    def __init__(self, signal, confidence, score, reasons, last, closes):
+        self.signal = signal
+        self.confidence = confidence
+        self.score = score
+        self.reasons = reasons
+        self.last = last
+        self.closes = closes
+        self.at = datetime.utcnow()
+
+    @property
+    def label(self):
+        return SIGNAL_LABELS[self.signal]
+
+    def reason_list(self):
+        return reason_strings(self.reasons, float(self.last.get("rsi", 50.0)))
+
+    def levels(self):
+        return levels_from_closes(self.closes, LEVELS_LOOKBACK)
+
+    def to_dict(self, levels=None):
+        """The dict hybrid_signal returns for the same bars."""
+        if self.reasons & INSUFFICIENT_DATA:
+            return {"signal": "HOLD", "confidence": 0.0, "reasons": ["insufficient_data"], "meta": {}}
+        return signal_dict(self.signal, self.confidence, self.reason_list(), self.last,
+                           levels or self.levels(), self.at)
+
+
+def fast_signal(close, volume=None, dtype=None):
+    """
+    hybrid_signal's score for the last bar of a series.
+    close / volume: 1-D arrays, oldest bar first, without NaNs (volume optional)
+    dtype: np.float64 or np.float32; defaults to float32 for float32 input, else float64
+    """
+    close = np.asarray(close)
+    if dtype is None:
+        dtype = np.float32 if close.dtype == np.float32 else np.float64
+    n = len(close)
+    closes = close[-LEVELS_LOOKBACK:]
+    if n < 5:
+        return SignalResult(0, 0.0, 0.0, INSUFFICIENT_DATA, {}, closes)
+
+    x = np.array(close[-_TAIL[np.dtype(dtype)]:], dtype=dtype)
+    # everything below is shift-invariant: work on deviations from the last close, which keeps
+    # float32 EMAs precise enough for the MACD difference
+    ref = x[-1]
+    x -= ref
+    ema_fast = _ewm(x, EMA_FAST)
+    ema_slow = _ewm(x, EMA_SLOW)
+    macd = ema_fast - ema_slow
+    macd_signal = _ewm(macd, MACD_SIGNAL)
+
+    delta = np.diff(x)
+    ma_up = _ewm(np.maximum(delta, 0), RSI_ALPHA)[-1]
+    ma_down = _ewm(np.maximum(-delta, 0), RSI_ALPHA)[-1]
+    # as add_indicators: rs = NaN where ma_down == 0, filled with 0 -> RSI 0
+    rsi = 100 - 100 / (1 + ma_up / ma_down) if ma_down != 0 else x.dtype.type(0.0)
+
+    sma9 = _last2(x, 9, np.mean)
+    sma21 = _last2(x, 21, np.mean)
+    bb_mid = _last2(x, 20, np.mean)[1]
+    bb_std = _last2(x, 20, _std)[1]
+    last = {
+        "close": ref,
+        "ema_fast": ema_fast[-1] + ref,
+        "ema_slow": ema_slow[-1] + ref,
+        "sma9": sma9[1] + ref,
+        "sma21": sma21[1] + ref,
+        "rsi": rsi,
+        "macd": macd[-1],
+        "macd_signal": macd_signal[-1],
+        "bb_upper": bb_mid + 2 * bb_std + ref,
+        "bb_lower": bb_mid - 2 * bb_std + ref,
+    }
+    prev = {
+        "sma9": sma9[0] + ref,
+        "sma21": sma21[0] + ref,
+        "macd": macd[-2],
+        "macd_signal": macd_signal[-2],
+    }
+    has_volume = volume is not None
+    if has_volume:
+        vol = np.asarray(volume[-20:], dtype=dtype)
+        last["volume"] = vol[-1]
+        last["vol_sma"] = vol.mean() if len(vol) == 20 else x.dtype.type(np.nan)
+
+    signal, confidence, score, reasons = score_arrays(last, prev, n, has_volume)
+    return SignalResult(int(signal), float(confidence), float(score), int(reasons), last, closes)
+
+
+def frame_signal(df, dtype=None):
+    """fast_signal on an OHLCV DataFrame's columns (no copy for float64 columns)."""
+    volume = df["volume"].to_numpy() if "volume" in df.columns else None
+    return fast_signal(df["close"].to_numpy(), volume, dtype)
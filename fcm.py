@@ -0,0 +1,187 @@
+# fcm.py
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import NOTIFICATIONS, stage
+
+MULTICAST_LIMIT = 500  # FCM caps a multicast at 500 tokens
+
+# firebase_admin is imported where it is used, so importing this module (and main.py) stays
+# cheap and nothing Firebase-side exists before a gunicorn fork
+
+
+def _send(message):
+    from firebase_admin import messaging
+    # send_each_for_multicast replaces send_multicast in newer firebase-admin releases
+    send = getattr(messaging, "send_each_for_multicast", None) or messaging.send_multicast
+    return send(message)
+
+
+def _is_dead(exc):
+    from firebase_admin import messaging
+    # per-token errors that mean the token will never work again
+    dead = tuple(e for e in (getattr(messaging, "UnregisteredError", None),
+                             getattr(messaging, "SenderIdMismatchError", None)) if e is not None)
+    if isinstance(exc, dead):
+        return True
+    return getattr(exc, "code", None) == "INVALID_ARGUMENT" and "token" in str(exc).lower()
+
+
+class TokenRegistry:
+    """
+    In-memory map of user id -> FCM token, loaded once and kept current by a Firestore
+    snapshot listener on the users collection (the listener's first snapshot is the load).
+    If that first snapshot is slow, start() reads the collection once instead, so the first
+    notifications don't go out to an empty token set.
+    """
+
+    def __init__(self, db, collection="users", field="fcmToken"):
+        self.db = db
+        self.collection = collection
+        self.field = field
+        self._tokens = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._synced = False  # the listener has delivered its first (full) snapshot
+        self._watch = None
+
+    def start(self, wait=10.0):
+        if self._watch is None:
+            self._watch = self.db.collection(self.collection).on_snapshot(self._on_snapshot)
+        if not self._ready.wait(wait):
+            print(f"⚠️ No token snapshot after {wait}s, reading {self.collection} once")
+            try:
+                self._load()
+            except Exception as e:
+                print(f"⚠️ Failed to load FCM tokens: {e}")
+        return self
+
+    def _token_map(self, docs):
+        tokens = {}
+        for doc in docs:
+            tok = (doc.to_dict() or {}).get(self.field)
+            if tok:
+                tokens[doc.id] = tok
+        return tokens
+
+    def _load(self):
+        tokens = self._token_map(self.db.collection(self.collection).get())
+        with self._lock:
+            if not self._synced:
+                self._tokens = tokens
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    def _on_snapshot(self, docs, changes, read_time):
+        with self._lock:
+            if not self._synced:
+                # the first snapshot is the whole collection: replaces a fallback load
+                self._tokens = self._token_map(docs)
+                self._synced = True
+                changes = ()
+            for change in changes:
+                uid = change.document.id
+                if change.type.name == "REMOVED":
+                    self._tokens.pop(uid, None)
+                    continue
+                tok = (change.document.to_dict() or {}).get(self.field)
+                if tok:
+                    self._tokens[uid] = tok
+                else:
+                    self._tokens.pop(uid, None)
+        self._ready.set()
+
+    def tokens(self):
+        with self._lock:
+            return list(dict.fromkeys(self._tokens.values()))
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def prune(self, dead):
+        """Drop dead tokens locally and clear them on their user docs."""
+        from firebase_admin import firestore
+        dead = set(dead)
+        with self._lock:
+            uids = [uid for uid, tok in self._tokens.items() if tok in dead]
+            for uid in uids:
+                del self._tokens[uid]
+        for uid in uids:
+            try:
+                self.db.collection(self.collection).document(uid).update(
+                    {self.field: firestore.DELETE_FIELD})
+            except Exception as e:
+                print(f"⚠️ Failed to clear token for {uid}: {e}")
+        return len(uids)
+
+
+class Notifier:
+    """
+    Background FCM fan-out. publish() only enqueues; a sender thread splits the registry's
+    tokens into 500-token multicasts, sends them concurrently and prunes dead tokens.
+    """
+
+    def __init__(self, registry, max_workers=4, max_queue=10000):
+        self.registry = registry
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        # started on first use so a preloaded gunicorn app starts it after fork
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def publish(self, signal):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(signal)
+        except queue.Full:
+            print("⚠️ Notification queue full, dropping", signal.get("symbol"))
+
+    def _run(self):
+        self.registry.start()
+        while True:
+            signal = self._queue.get()
+            try:
+                self.send(signal)
+            except Exception as e:
+                print("⚠️ Notification error:", e)
+
+    def send(self, data):
+        tokens = self.registry.tokens()
+        if not tokens:
+            return 0
+        chunks = [tokens[i:i + MULTICAST_LIMIT] for i in range(0, len(tokens), MULTICAST_LIMIT)]
+        with stage("notify"):
+            results = list(self._pool.map(lambda chunk: self._send_chunk(data, chunk), chunks))
+        sent = sum(ok for ok, _ in results)
+        dead = [tok for _, bad in results for tok in bad]
+        pruned = self.registry.prune(dead) if dead else 0
+        NOTIFICATIONS.labels("sent").inc(sent)
+        NOTIFICATIONS.labels("failed").inc(len(tokens) - sent)
+        NOTIFICATIONS.labels("pruned").inc(pruned)
+        print(f"✅ Sent notification to {sent}/{len(tokens)} users ({pruned} dead tokens pruned)")
+        return sent
+
+    def _send_chunk(self, data, tokens):
+        from firebase_admin import messaging
+        message = messaging.MulticastMessage(
+            tokens=tokens,
+            notification=messaging.Notification(
+                title=f"New {data['signal']} Signal",
+                body=f"{data['symbol']} @ {data.get('last_price','')}"
+            ),
+            data={"symbol": data["symbol"], "signal": data["signal"]}
+        )
+        response = _send(message)
+        dead = [tokens[i] for i, r in enumerate(response.responses)
+                if not r.success and _is_dead(r.exception)]
+        return response.success_count, dead
@@ -0,0 +1,73 @@
+# firebase_app.py
+"""
+Lazy Firebase / Firestore access for every entry point. firebase_admin is imported and the
+app initialised on the first Firestore call, not at import: imports stay fast, and a
+gunicorn --preload master forks before any gRPC channel exists (they don't survive fork).
+If the parent did connect, the child drops the default app too (firestore.client() caches
+its client on the app) and builds its own on first use.
+
+    from firebase_app import db       # use like a firestore.Client
+"""
+import os
+import sys
+import json
+import threading
+
+_lock = threading.Lock()
+_client = None
+
+
+def _after_fork():
+    # a client created in the parent is unusable in the child: build a new one there. The
+    # cached client lives on the default app, so that has to go as well
+    global _lock, _client
+    _lock = threading.Lock()
+    _client = None
+    firebase_admin = sys.modules.get("firebase_admin")
+    if firebase_admin is not None:
+        try:
+            firebase_admin.delete_app(firebase_admin.get_app())
+        except ValueError:
+            pass
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def init_app():
+    """Default Firebase app from FIREBASE_SERVICE_ACCOUNT (JSON) or serviceAccount.json."""
+    import firebase_admin
+    from firebase_admin import credentials
+    try:
+        return firebase_admin.get_app()
+    except ValueError:
+        pass
+    cred_json = os.getenv("FIREBASE_SERVICE_ACCOUNT")
+    if cred_json:
+        cred = credentials.Certificate(json.loads(cred_json))
+    else:
+        cred = credentials.Certificate("serviceAccount.json")
+    return firebase_admin.initialize_app(cred)
+
+
+def get_db():
+    """The process's Firestore client, created on first use."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                from firebase_admin import firestore
+                init_app()
+                _client = firestore.client()
+                print("✅ Firestore connected")
+    return _client
+
+
+class LazyClient:
+    """Module-level stand-in for the Firestore client; resolves it on first attribute access."""
+
+    def __getattr__(self, name):
+        return getattr(get_db(), name)
+
+
+db = LazyClient()
@@ -0,0 +1,297 @@
+# incremental.py
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+# Same spans/windows as signals.add_indicators
+EMA_FAST_SPAN = 12
+EMA_SLOW_SPAN = 26
+MACD_SIGNAL_SPAN = 9
+RSI_COM = 13
+SMA_FAST = 9
+SMA_SLOW = 21
+BB_WINDOW = 20
+BB_K = 2
+VOL_WINDOW = 20
+
+# running sums drift after many add/remove steps; re-sum the window this often
+_RESYNC_EVERY = 1024
+
+
+def _alpha_span(span):
+    return 2.0 / (span + 1.0)
+
+def _alpha_com(com):
+    return 1.0 / (1.0 + com)
+
+def _ewm(prev, x, alpha, gap=0):
+    # pandas ewm(adjust=False): y0 = x0, y_t = (1 - a) * y_{t-1} + a * x_t. A NaN input carries
+    # the last value; after `gap` NaNs the old value's weight has decayed gap more steps
+    # (ignore_na=False): y_t = (w * y_prev + a * x_t) / (w + a) with w = (1 - a) ** (gap + 1)
+    if math.isnan(x):
+        return np.nan if prev is None else prev
+    if prev is None or math.isnan(prev):
+        return x
+    if not gap:
+        return (1.0 - alpha) * prev + alpha * x
+    w = (1.0 - alpha) ** (gap + 1)
+    return (w * prev + alpha * x) / (w + alpha)
+
+
+def _nans(base, field):
+    # NaN inputs in a row right before this bar, for _ewm's gap
+    return base[field] if base is not None else 0
+
+
+class _Window:
+    """
+    Fixed-size rolling window with O(1) push / replace-last.
+    Keeps a running sum for the mean and (optionally) a sliding Welford M2 for the std.
+    NaNs are counted, not summed: like pandas rolling(), the window is NaN while it holds one,
+    and the sums are rebuilt from the finite values when a NaN enters or leaves.
+    """
+    __slots__ = ("size", "values", "total", "mean", "m2", "nans", "with_var", "_steps")
+
+    def __init__(self, size, with_var=False):
+        self.size = size
+        self.values = deque(maxlen=size)
+        self.total = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.nans = 0
+        self.with_var = with_var
+        self._steps = 0
+
+    def push(self, x):
+        if len(self.values) == self.size:
+            old = self.values[0]
+            self.values.append(x)
+            if math.isnan(x) or math.isnan(old):
+                self._resync()
+            else:
+                self._swap(old, x)
+        elif math.isnan(x):
+            self.values.append(x)
+            self._resync()
+        else:
+            self.values.append(x)
+            self.total += x
+            if self.with_var:
+                n = len(self.values)
+                d = x - self.mean
+                self.mean += d / n
+                self.m2 += d * (x - self.mean)
+        self._steps += 1
+        if self._steps % _RESYNC_EVERY == 0:
+            self._resync()
+
+    def replace_last(self, x):
+        old = self.values[-1]
+        self.values[-1] = x
+        if math.isnan(x) or math.isnan(old):
+            self._resync()
+        else:
+            self._swap(old, x)
+
+    def _swap(self, old, new):
+        # one value leaves the window, another enters; window length unchanged
+        self.total += new - old
+        if self.with_var:
+            n = len(self.values)
+            d = new - old
+            mean_old = self.mean
+            self.mean += d / n
+            self.m2 += d * (new - self.mean + old - mean_old)
+
+    def _resync(self):
+        vals = np.fromiter(self.values, dtype=float, count=len(self.values))
+        finite = ~np.isnan(vals)
+        self.nans = len(vals) - int(finite.sum())
+        vals = vals[finite]
+        self.total = float(vals.sum())
+        if self.with_var:
+            self.mean = float(vals.mean()) if len(vals) else 0.0
+            self.m2 = float(((vals - self.mean) ** 2).sum())
+
+    def full(self):
+        return len(self.values) == self.size
+
+    def avg(self):
+        return self.total / self.size if self.full() and not self.nans else np.nan
+
+    def std(self):
+        if not self.full() or self.nans or self.size < 2:
+            return np.nan
+        return math.sqrt(max(self.m2, 0.0) / (self.size - 1))
+
+
+class IndicatorState:
+    """
+    Incremental version of signals.add_indicators for one (symbol, timeframe) series.
+
+    update() appends a new candle, or revises the last one if the timestamp repeats
+    (the still-forming bar), in O(1). Values match add_indicators run over the same
+    series within float tolerance, and hybrid_signal accepts the state directly.
+    """
+
+    def __init__(self, history=150, has_volume=True):
+        self.has_volume = has_volume
+        self.last_time = None
+        self._count = 0
+        self._rows = deque(maxlen=2)          # indicator rows for prev / last bar
+        self._closes = deque(maxlen=history)  # raw closes for support/resistance
+        self._times = deque(maxlen=history)
+        self._sma_fast = _Window(SMA_FAST)
+        self._sma_slow = _Window(SMA_SLOW)
+        self._bb = _Window(BB_WINDOW, with_var=True)
+        self._vol = _Window(VOL_WINDOW)
+
+    def __len__(self):
+        return self._count
+
+    @classmethod
+    def from_frame(cls, df, history=150):
+        state = cls(history=history, has_volume='volume' in df.columns)
+        state.extend(df)
+        return state
+
+    def extend(self, df):
+        times = df['time'] if 'time' in df.columns else df.index.to_series()
+        closes = df['close'].astype(float).to_numpy()
+        volumes = df['volume'].astype(float).to_numpy() if self.has_volume else None
+        for i, t in enumerate(times):
+            self.update(t, closes[i], volumes[i] if volumes is not None else None)
+        return self
+
+    def update(self, time, close, volume=None):
+        """
+        Feed one candle. A repeated timestamp revises the last bar instead of appending.
+        Returns the indicator row for that bar.
+        """
+        if time is not None and self.last_time is not None:
+            if time == self.last_time:
+                return self.revise(close, volume)
+            if time < self.last_time:
+                raise ValueError(f"candle at {time} is older than last bar {self.last_time}")
+        return self.append(close, volume, time)
+
+    def append(self, close, volume=None, time=None):
+        close = float(close)
+        base = self._rows[-1] if self._rows else None
+        self._closes.append(close)
+        self._times.append(time)
+        self._sma_fast.push(close)
+        self._sma_slow.push(close)
+        self._bb.push(close)
+        if self.has_volume:
+            self._vol.push(float(volume) if volume is not None else np.nan)
+        row = self._compute(base, close, volume)
+        self._rows.append(row)
+        self._count += 1
+        self.last_time = time
+        return row
+
+    def revise(self, close, volume=None):
+        if not self._rows:
+            raise ValueError("no bar to revise")
+        close = float(close)
+        base = self._rows[0] if len(self._rows) == 2 else None
+        self._closes[-1] = close
+        self._sma_fast.replace_last(close)
+        self._sma_slow.replace_last(close)
+        self._bb.replace_last(close)
+        if self.has_volume:
+            self._vol.replace_last(float(volume) if volume is not None else np.nan)
+        row = self._compute(base, close, volume)
+        self._rows[-1] = row
+        return row
+
+    def _compute(self, base, close, volume):
+        # base: the previous bar's row (recursion state), None for the first bar
+        gap = _nans(base, 'close_nans')
+        ema_fast = _ewm(base and base['ema_fast'], close, _alpha_span(EMA_FAST_SPAN), gap)
+        ema_slow = _ewm(base and base['ema_slow'], close, _alpha_span(EMA_SLOW_SPAN), gap)
+        macd = ema_fast - ema_slow
+        macd_signal = _ewm(base and base['macd_signal'], macd, _alpha_span(MACD_SIGNAL_SPAN))
+
+        # RSI: first delta is NaN, so the smoothed up/down start on the second bar (a NaN close
+        # makes its own delta and the next one NaN, as close.diff() does)
+        delta = np.nan if base is None else close - base['close']
+        delta_gap = _nans(base, 'delta_nans')
+        if math.isnan(delta):
+            up = down = np.nan
+        else:
+            up, down = max(delta, 0.0), max(-delta, 0.0)
+        ma_up = _ewm(base and base['ma_up'], up, _alpha_com(RSI_COM), delta_gap)
+        ma_down = _ewm(base and base['ma_down'], down, _alpha_com(RSI_COM), delta_gap)
+        rs = ma_up / ma_down if ma_down else np.nan
+        rsi = 100 - (100 / (1 + (0.0 if math.isnan(rs) else rs)))
+
+        bb_mid = self._bb.avg()
+        bb_std = self._bb.std()
+        row = {
+            "close": close,
+            "ema_fast": ema_fast,
+            "ema_slow": ema_slow,
+            "sma9": self._sma_fast.avg(),
+            "sma21": self._sma_slow.avg(),
+            "rsi": rsi,
+            "ma_up": ma_up,
+            "ma_down": ma_down,
+            "macd": macd,
+            "macd_signal": macd_signal,
+            "bb_mid": bb_mid,
+            "bb_std": bb_std,
+            "bb_upper": bb_mid + BB_K * bb_std,
+            "bb_lower": bb_mid - BB_K * bb_std,
+            "close_nans": gap + 1 if math.isnan(close) else 0,
+            "delta_nans": delta_gap + 1 if math.isnan(delta) else 0,
+        }
+        if self.has_volume:
+            row["volume"] = float(volume) if volume is not None else np.nan
+            row["vol_sma"] = self._vol.avg()
+        return row
+
+    def last_rows(self):
+        """(prev, last) indicator rows, as hybrid_signal scores them."""
+        return self._rows[0], self._rows[-1]
+
+    def close_series(self):
+        return pd.Series(self._closes, dtype=float)
+
+
+class IndicatorEngine:
+    """
+    Holds one IndicatorState per (symbol, timeframe) across worker cycles.
+    """
+
+    def __init__(self, history=150):
+        self.history = history
+        self._states = {}
+
+    def get(self, symbol, timeframe):
+        return self._states.get((symbol, timeframe))
+
+    def reset(self, symbol=None, timeframe=None):
+        if symbol is None:
+            self._states.clear()
+        else:
+            self._states.pop((symbol, timeframe), None)
+
+    def sync(self, symbol, timeframe, df):
+        """
+        Bring the state for (symbol, timeframe) up to date with a freshly fetched frame.
+        Only candles from the state's last bar onwards are fed in (the last bar is revised);
+        a frame that no longer overlaps the state re-seeds it from scratch.
+        """
+        key = (symbol, timeframe)
+        state = self._states.get(key)
+        times = df['time'] if 'time' in df.columns else df.index.to_series()
+        if state is not None and state.last_time is not None and (times == state.last_time).any():
+            state.extend(df[(times >= state.last_time).to_numpy()])
+        else:
+            state = IndicatorState.from_frame(df, history=self.history)
+            self._states[key] = state
+        return state
@@ -1,28 +1,26 @@
 # main.py
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import firebase_admin
-from firebase_admin import credentials, firestore, messaging
 import os
+import hashlib
 from datetime import datetime
+from write_buffer import commit_batched
+from fcm import TokenRegistry, Notifier
+from cache import TTLCache
+from metrics import instrument_app, stage
+from firebase_app import db
 
 app = Flask(__name__)
-CORS(app)
+# browsers only let page scripts read these response headers if they are exposed
+CORS(app, expose_headers=["X-Next-Cursor", "ETag"])
+# per-route latency histograms + /metrics (set PROMETHEUS_MULTIPROC_DIR to aggregate gunicorn workers)
+instrument_app(app)
 
-# Firebase init
-cred_json = os.getenv("FIREBASE_SERVICE_ACCOUNT")
-if cred_json:
-    import json
-    cred = credentials.Certificate(json.loads(cred_json))
-else:
-    cred = credentials.Certificate("serviceAccount.json")
+# Firebase is initialised on the first Firestore call (firebase_app), so the app can be
+# preloaded by gunicorn and forked before any client exists
 
-try:
-    firebase_admin.get_app()
-except ValueError:
-    firebase_admin.initialize_app(cred)
-
-db = firestore.client()
+# FCM tokens cached in memory (kept current by a snapshot listener) + background sender
+notifier = Notifier(TokenRegistry(db))
 
 # --- Root ---
 @app.route("/")
@@ -41,40 +39,111 @@ def add_signal():
 
     # Save in Firestore
     ref = db.collection("signals").document()
-    ref.set(data)
+    with stage("persist"):
+        ref.set(data)
+    signals_cache.clear()
 
-    # Send FCM notification to all users with tokens
-    try:
-        tokens = []
-        users = db.collection("users").stream()
-        for u in users:
-            tok = u.to_dict().get("fcmToken")
-            if tok:
-                tokens.append(tok)
-
-        if tokens:
-            message = messaging.MulticastMessage(
-                tokens=tokens,
-                notification=messaging.Notification(
-                    title=f"New {data['signal']} Signal",
-                    body=f"{data['symbol']} @ {data.get('last_price','')}"
-                ),
-                data={"symbol": data["symbol"], "signal": data["signal"]}
-            )
-            response = messaging.send_multicast(message)
-            print(f"✅ Sent notification to {response.success_count}/{len(tokens)} users")
-    except Exception as e:
-        print("⚠️ Notification error:", e)
+    notify_all([data])
 
     return jsonify({"success": True, "id": ref.id})
 
 
+# --- Save many signals (one batched commit per 500) ---
+@app.route("/add-signals", methods=["POST"])
+def add_signals():
+    items = request.json
+    if isinstance(items, dict):
+        items = items.get("signals")
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "invalid data"}), 400
+
+    docs, errors = [], []
+    now = datetime.utcnow().isoformat()
+    for i, data in enumerate(items):
+        if not isinstance(data, dict) or "symbol" not in data:
+            errors.append({"index": i, "error": "invalid data"})
+            continue
+        data["timestamp"] = now
+        docs.append(data)
+
+    with stage("persist"):
+        ids = commit_batched(db, "signals", docs)
+    signals_cache.clear()
+    notify_all(docs)
+
+    return jsonify({"success": True, "ids": ids, "errors": errors})
+
+
+def notify_all(signals):
+    # FCM fan-out runs on the notifier's background thread; this only enqueues. Repeats are
+    # filtered by the workers before they post (SignalState), not per gunicorn process here
+    for data in signals:
+        notifier.publish(data)
+
+
 # --- List signals ---
+# read-through cache per (filters, page); cleared on every write in this process, and the
+# TTL bounds staleness for writes that landed in another gunicorn worker
+signals_cache = TTLCache(maxsize=512, ttl=float(os.getenv("SIGNALS_CACHE_TTL", "15")))
+
 @app.route("/signals", methods=["GET"])
 def get_signals():
-    snap = db.collection("signals").order_by("timestamp", direction=firestore.Query.DESCENDING).limit(30).stream()
-    signals = [s.to_dict() | {"id": s.id} for s in snap]
-    return jsonify(signals)
+    """
+    Latest signals, newest first.
+    Query: symbol, interval (filters), since (ISO timestamp, only newer signals),
+           cursor (id from the previous page's X-Next-Cursor header; 400 if it no longer exists),
+           limit (default 30, max 100)
+    Supports If-None-Match: an unchanged page answers 304 with no body.
+    """
+    try:
+        limit = min(max(int(request.args.get("limit", 30)), 1), 100)
+    except ValueError:
+        return jsonify({"error": "invalid limit"}), 400
+    symbol = request.args.get("symbol")
+    interval = request.args.get("interval")
+    since = request.args.get("since")
+    cursor = request.args.get("cursor")
+
+    key = (symbol, interval, since, cursor, limit)
+    page = signals_cache.get(key)
+    if page is None:
+        signals = query_signals(symbol, interval, since, cursor, limit)
+        if signals is None:
+            return jsonify({"error": "invalid cursor"}), 400
+        body = jsonify(signals).get_data()
+        next_cursor = signals[-1]["id"] if len(signals) == limit else None
+        page = (body, hashlib.sha1(body).hexdigest(), next_cursor)
+        signals_cache.set(key, page)
+
+    body, etag, next_cursor = page
+    resp = app.response_class(body, mimetype="application/json")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    if next_cursor:
+        resp.headers["X-Next-Cursor"] = next_cursor
+    return resp.make_conditional(request)
+
+
+def query_signals(symbol=None, interval=None, since=None, cursor=None, limit=30):
+    """One page of signals as dicts, or None if `cursor` names an unknown / deleted signal."""
+    last = None
+    if cursor:
+        last = db.collection("signals").document(cursor).get()
+        if not last.exists:
+            return None
+    from firebase_admin import firestore
+    # filtered queries are served by the composite indexes in firestore.indexes.json
+    q = db.collection("signals")
+    if symbol:
+        q = q.where("symbol", "==", symbol)
+    if interval:
+        q = q.where("interval", "==", interval)
+    if since:
+        q = q.where("timestamp", ">", since)
+    q = q.order_by("timestamp", direction=firestore.Query.DESCENDING)
+    if last is not None:
+        q = q.start_after(last)
+    return [s.to_dict() | {"id": s.id} for s in q.limit(limit).stream()]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,207 @@
+# metrics.py
+import os
+import sys
+import time
+import threading
+from collections import Counter as Tally
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter,
+                               Histogram, generate_latest)
+
+# /debug/profile endpoints are only exposed when this is set
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "0") == "1"
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+           10.0, 30.0, 60.0)
+
+STAGE_SECONDS = Histogram("protrader_stage_seconds", "Time spent per pipeline stage",
+                          ["stage"], buckets=BUCKETS)
+STAGE_ERRORS = Counter("protrader_stage_errors_total", "Exceptions raised per pipeline stage",
+                       ["stage"])
+CYCLE_SECONDS = Histogram("protrader_cycle_seconds", "Duration of one worker cycle",
+                          ["worker"], buckets=BUCKETS)
+SIGNALS = Counter("protrader_signals_total", "Signals produced", ["signal"])
+SIGNAL_CHANGES = Counter("protrader_signal_changes_total",
+                         "Signal readings by emit reason, or suppressed as unchanged", ["result"])
+SCORED = Counter("protrader_scored_total", "(symbol, timeframe) pairs scored", ["timeframe"])
+SCHEDULE_LAG = Histogram("protrader_schedule_lag_seconds",
+                         "Delay between a candle-close tick and the start of its run",
+                         buckets=BUCKETS)
+SCHEDULE_SKIPPED = Counter("protrader_schedule_skipped_total",
+                           "Scheduled runs skipped (previous run still going, or missed)",
+                           ["reason"])
+WRITES = Counter("protrader_writes_total", "Buffered writes flushed", ["result"])
+FETCH_RETRIES = Counter("protrader_fetch_retries_total", "Exchange requests retried")
+NOTIFICATIONS = Counter("protrader_notifications_total", "FCM deliveries", ["result"])
+HTTP_SECONDS = Histogram("protrader_http_request_seconds", "HTTP request latency",
+                         ["route", "method", "status"], buckets=BUCKETS)
+ORDER_SECONDS = Histogram("protrader_order_latency_seconds",
+                          "Signal timestamp to broker order acknowledgment",
+                          ["broker", "result"], buckets=BUCKETS)
+ORDERS = Counter("protrader_orders_total", "Orders dispatched", ["broker", "result"])
+
+
+@contextmanager
+def stage(name):
+    """Time a pipeline stage (fetch / indicators / score / persist / notify)."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.labels(name).inc()
+        raise
+    finally:
+        STAGE_SECONDS.labels(name).observe(time.perf_counter() - start)
+
+
+def timed(name):
+    """Decorator form of stage()."""
+    def wrap(fn):
+        @wraps(fn)
+        def inner(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def render():
+    """Prometheus text exposition of this process (or of all gunicorn workers in multiprocess mode)."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+# ---------- sampling profiler ----------
+class Sampler:
+    """
+    Wall-clock sampling profiler: a daemon thread records every other thread's stack each
+    `interval` seconds. report() returns collapsed stacks ("a;b;c count" lines), which
+    flamegraph.pl and speedscope read directly. start() / stop() can be called at any time.
+    """
+
+    def __init__(self, interval=0.01, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = Tally()
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, interval=None):
+        with self._lock:
+            if self._thread is None:
+                self.interval = interval or self.interval
+                self.samples.clear()
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+    def report(self, top=None):
+        return "\n".join(f"{stack} {n}" for stack, n in self.samples.most_common(top)) + "\n"
+
+
+sampler = Sampler()
+
+
+def profile_action(action, interval=None):
+    """start / stop / report for the /debug/profile endpoints; returns the response text."""
+    if action == "start":
+        sampler.start(interval)
+        return f"profiler started ({sampler.interval}s interval)\n"
+    if action == "stop":
+        sampler.stop()
+        return f"profiler stopped, {sum(sampler.samples.values())} samples\n"
+    return sampler.report()
+
+
+# ---------- exposure ----------
+def instrument_app(app):
+    """Per-route latency histogram and a /metrics endpoint for a Flask app."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe(response):
+        start = g.pop("_metrics_start", None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            HTTP_SECONDS.labels(route, request.method, str(response.status_code)).observe(
+                time.perf_counter() - start)
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(render(), mimetype=CONTENT_TYPE_LATEST)
+
+    if PROFILER_ENABLED:
+        @app.route("/debug/profile", defaults={"action": "report"})
+        @app.route("/debug/profile/<action>")
+        def debug_profile(action):
+            interval = request.args.get("interval", type=float)
+            return Response(profile_action(action, interval), mimetype="text/plain")
+    return app
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if path == "/metrics":
+            body, ctype = render(), CONTENT_TYPE_LATEST
+        elif PROFILER_ENABLED and path.startswith("/debug/profile"):
+            action = path[len("/debug/profile/"):] or "report"
+            body, ctype = profile_action(action).encode(), "text/plain"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port, addr="0.0.0.0"):
+    """Background /metrics (and /debug/profile) server for the workers; port 0 disables it."""
+    if not port:
+        return None
+    server = ThreadingHTTPServer((addr, port), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"📈 Metrics on :{port}/metrics")
+    return server
@@ -0,0 +1,318 @@
+# orders.py
+import os
+import json
+import time
+import queue
+import hashlib
+import threading
+from concurrent.futures import Future
+from datetime import datetime, timezone
+
+from brokers import place_order_for_user_broker
+from cache import TTLCache
+from metrics import ORDER_SECONDS, ORDERS
+
+# worker threads per broker; orders for different users of one broker go out in parallel
+ORDER_WORKERS = {"zerodha": 8, "angelone": 4}
+DEFAULT_ORDER_WORKERS = 4
+MAX_BATCH = int(os.getenv("ORDER_MAX_BATCH", "20"))
+ORDER_RETRIES = int(os.getenv("ORDER_RETRIES", "2"))
+IDEMPOTENCY_TTL = float(os.getenv("ORDER_IDEMPOTENCY_TTL", str(24 * 3600)))
+
+# failures before a connection to the broker existed, so nothing was sent: retried, and the key
+# is released. Matched on the exact class of the error or of its causes, never on base classes
+# (ConnectionResetError / requests' ConnectionError can come after the body went out)
+_PRE_CONNECT = frozenset({"ConnectTimeout", "ConnectTimeoutError", "NewConnectionError",
+                          "NameResolutionError", "gaierror"})
+# the broker answered and refused the order: not retried, key released
+_REJECTED = frozenset({"InputException", "OrderException", "TokenException", "BrokerRejected"})
+# anything else may or may not have placed the order: not retried, and the key stays taken
+
+
+class DuplicateOrder(Exception):
+    """Another process already claimed this idempotency key."""
+
+
+def order_key(user, broker, payload, signal_time):
+    """Default idempotency key: the same order for the same signal always hashes the same."""
+    if signal_time is None:
+        raise ValueError("order_key needs the signal time (or pass an explicit idempotency_key)")
+    raw = json.dumps([user, broker.lower(), payload, signal_time], sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _epoch(ts):
+    """Signal timestamp (epoch s / ms, ISO string or datetime) -> epoch seconds."""
+    if ts is None:
+        return None
+    if isinstance(ts, datetime):
+        return (ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)).timestamp()
+    if isinstance(ts, str):
+        return _epoch(datetime.fromisoformat(ts))
+    ts = float(ts)
+    return ts / 1000.0 if ts > 1e11 else ts
+
+
+def _causes(exc):
+    # the error, what it was raised from, and urllib3's MaxRetryError.reason inside requests' errors
+    seen = []
+    while exc is not None and exc not in seen:
+        seen.append(exc)
+        for arg in getattr(exc, "args", ()):
+            reason = getattr(arg, "reason", None)
+            if isinstance(reason, BaseException):
+                seen.append(reason)
+        exc = exc.__cause__ or exc.__context__
+    return seen
+
+
+def _http_status(exc):
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None) or getattr(exc, "status_code", None)
+
+
+def _pre_connect(exc):
+    """Nothing reached the broker: safe to send again."""
+    return any(type(e).__name__ in _PRE_CONNECT for e in _causes(exc))
+
+
+def _rejected(exc):
+    """The broker definitely refused the order (or it was refused before being sent)."""
+    if {cls.__name__ for cls in type(exc).__mro__} & _REJECTED:
+        return True
+    status = _http_status(exc)
+    return isinstance(status, int) and 400 <= status < 500
+
+
+class Order:
+    __slots__ = ("key", "user", "broker", "creds", "payload", "signal_time", "queued_at",
+                 "attempts", "future")
+
+    def __init__(self, key, user, broker, creds, payload, signal_time):
+        self.key = key
+        self.user = user
+        self.broker = broker
+        self.creds = creds
+        self.payload = payload
+        self.signal_time = _epoch(signal_time)
+        self.queued_at = time.time()
+        self.attempts = 0
+        self.future = Future()
+
+    @property
+    def account(self):
+        creds = self.creds or {}
+        return (creds.get("api_key"), creds.get("access_token") or creds.get("jwt_token"))
+
+
+class FirestoreKeys:
+    """
+    Cross-process idempotency keys: create() on a key doc succeeds for exactly one caller,
+    so gunicorn workers or a second server can't place the same order twice.
+    """
+
+    def __init__(self, db, collection="order_keys"):
+        self.col = db.collection(collection)
+
+    def claim(self, key):
+        from google.api_core.exceptions import AlreadyExists
+        try:
+            self.col.document(key).create({"createdAt": datetime.utcnow()})
+            return True
+        except AlreadyExists:
+            return False
+
+    def release(self, key):
+        self.col.document(key).delete()
+
+
+class OrderDispatcher:
+    """
+    In-process order queue with one worker pool per broker.
+
+    submit() returns a Future immediately; resubmitting an idempotency key that is in flight or
+    filled returns the original Future instead of placing a second order. Keys are released
+    again only when the order never left (connect failures) or the broker rejected it; any
+    other error keeps the key taken, since the order may have been placed.
+
+    batch_fns: {broker: fn(creds, [payload, ...]) -> [result or Exception, ...]} for brokers
+    with a multi-order endpoint. Queued orders of one account are then drained together (up to
+    max_batch). This is a hook only: neither Kite nor SmartAPI has such an endpoint, so none
+    ships, and every order is placed on its own on the pooled client of brokers.py.
+
+    place_fn / batch_fns / keys are injectable so the dispatcher runs against fake brokers.
+    """
+
+    def __init__(self, place_fn=place_order_for_user_broker, batch_fns=None, workers=None,
+                 max_batch=MAX_BATCH, retries=ORDER_RETRIES, keys=None,
+                 idempotency_ttl=IDEMPOTENCY_TTL):
+        self.place_fn = place_fn
+        self.batch_fns = {k.lower(): v for k, v in (batch_fns or {}).items()}
+        self.workers = {**ORDER_WORKERS, **(workers or {})}
+        self.max_batch = max_batch
+        self.retries = retries
+        self.keys = keys
+        self._seen = TTLCache(maxsize=100_000, ttl=idempotency_ttl)
+        self._queues = {}
+        self._threads = []
+        self._lock = threading.Lock()
+
+    # ---------- submission ----------
+    def submit(self, user, broker, creds, payload, idempotency_key=None, signal_time=None):
+        """Needs idempotency_key or signal_time: without either, two genuine orders would collide."""
+        bk = broker.lower()
+        key = idempotency_key or order_key(user, bk, payload, signal_time)
+        order = Order(key, user, bk, creds, payload, signal_time)
+        with self._lock:
+            existing = self._seen.get(key)
+            if existing is not None:
+                return existing
+            self._seen.set(key, order.future)
+
+        if self.keys is not None:
+            try:
+                claimed = self.keys.claim(key)
+            except Exception as e:
+                self._seen.invalidate(key)
+                order.future.set_exception(e)
+                return order.future
+            if not claimed:
+                order.future.set_exception(DuplicateOrder(key))
+                return order.future
+
+        self._queue(bk).put(order)
+        return order.future
+
+    def submit_many(self, orders):
+        """orders: dicts with user, broker, creds, payload and optional idempotency_key / signal_time."""
+        return [self.submit(o["user"], o["broker"], o.get("creds"), o["payload"],
+                            o.get("idempotency_key"), o.get("signal_time")) for o in orders]
+
+    def _queue(self, bk):
+        # workers start on first use so a preloaded gunicorn app starts them after fork
+        with self._lock:
+            q = self._queues.get(bk)
+            if q is None:
+                q = self._queues[bk] = queue.Queue()
+                for i in range(self.workers.get(bk, DEFAULT_ORDER_WORKERS)):
+                    t = threading.Thread(target=self._run, args=(bk, q), daemon=True,
+                                         name=f"orders-{bk}-{i}")
+                    t.start()
+                    self._threads.append(t)
+            return q
+
+    # ---------- workers ----------
+    def _run(self, bk, q):
+        batch_fn = self.batch_fns.get(bk)
+        while True:
+            order = q.get()
+            if order is None:
+                return
+            if batch_fn is None:
+                self._place(bk, order)
+                continue
+            batch = [order]
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    nxt = q.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stop = True
+                    break
+                batch.append(nxt)
+            accounts = {}
+            for o in batch:
+                accounts.setdefault(o.account, []).append(o)
+            for orders in accounts.values():
+                if len(orders) == 1:
+                    self._place(bk, orders[0])
+                else:
+                    self._place_batch(bk, batch_fn, orders)
+            if stop:
+                return
+
+    def _attempt(self, orders, fn):
+        """fn() with retries for errors raised before the request reached the broker."""
+        while True:
+            for o in orders:
+                o.attempts += 1
+            try:
+                return fn()
+            except Exception as e:
+                if orders[0].attempts > self.retries or not _pre_connect(e):
+                    raise
+                time.sleep(0.05 * 2 ** (orders[0].attempts - 1))
+
+    def _place(self, bk, order):
+        try:
+            res = self._attempt([order], lambda: self.place_fn(bk, order.creds, order.payload))
+        except Exception as e:
+            self._fail(order, e)
+        else:
+            self._ack(order, res)
+
+    def _place_batch(self, bk, batch_fn, orders):
+        try:
+            results = self._attempt(orders, lambda: batch_fn(orders[0].creds,
+                                                             [o.payload for o in orders]))
+        except Exception as e:
+            for o in orders:
+                self._fail(o, e)
+            return
+        results = list(results)
+        for i, o in enumerate(orders):
+            if i >= len(results):
+                # the batch went out, so these may have been placed: failed, key kept
+                self._fail(o, RuntimeError(f"{bk} batch returned {len(results)} results "
+                                           f"for {len(orders)} orders"))
+            elif isinstance(results[i], Exception):
+                self._fail(o, results[i])
+            else:
+                self._ack(o, results[i])
+
+    # ---------- completion ----------
+    def _latency(self, order):
+        return time.time() - (order.signal_time or order.queued_at)
+
+    def _ack(self, order, res):
+        latency = self._latency(order)
+        ORDER_SECONDS.labels(order.broker, "ok").observe(latency)
+        ORDERS.labels(order.broker, "ok").inc()
+        out = dict(res) if isinstance(res, dict) else {"result": res}
+        out.update({
+            "idempotency_key": order.key,
+            "latency_ms": round(latency * 1000, 3),
+            "queue_ms": round((time.time() - order.queued_at) * 1000, 3),
+            "attempts": order.attempts,
+        })
+        order.future.set_result(out)
+
+    def _fail(self, order, exc):
+        ORDER_SECONDS.labels(order.broker, "error").observe(self._latency(order))
+        ORDERS.labels(order.broker, "error").inc()
+        if _pre_connect(exc) or _rejected(exc):
+            # the broker never took the order: let a retry with the same key through
+            self._seen.invalidate(order.key)
+            if self.keys is not None:
+                try:
+                    self.keys.release(order.key)
+                except Exception as e:
+                    print(f"⚠️ Failed to release order key {order.key}: {e}")
+        print(f"⚠️ Order failed for {order.user} on {order.broker}: {exc}")
+        order.future.set_exception(exc)
+
+    def pending(self):
+        return {bk: q.qsize() for bk, q in self._queues.items()}
+
+    def close(self, timeout=10.0):
+        """Let queued orders finish, then stop the workers."""
+        with self._lock:
+            for bk, q in self._queues.items():
+                for _ in range(self.workers.get(bk, DEFAULT_ORDER_WORKERS)):
+                    q.put(None)
+            threads, self._threads = self._threads, []
+            self._queues = {}
+        for t in threads:
+            t.join(timeout)
@@ -0,0 +1,316 @@
+# panel.py
+# Panel mode for hybrid_signal: score a whole (symbol x timeframe x bars) stack in one NumPy
+# pass. Recursions loop over the bar axis only; everything else is one array op over all cells.
+from datetime import datetime
+
+import numpy as np
+
+from pivots import batch_levels
+
+OHLCV = ("open", "high", "low", "close", "volume")
+
+# reason bitmask flags, in the order hybrid_signal appends its reasons
+TREND_UP = 1 << 0
+TREND_DOWN = 1 << 1
+SMA_CROSS_UP = 1 << 2
+SMA_CROSS_DOWN = 1 << 3
+MACD_BULLISH = 1 << 4
+MACD_BEARISH = 1 << 5
+RSI_OVERSOLD = 1 << 6
+RSI_OVERBOUGHT = 1 << 7
+BB_BREAKOUT_UP = 1 << 8
+BB_BREAKOUT_DOWN = 1 << 9
+VOLUME_SPIKE = 1 << 10
+INSUFFICIENT_DATA = 1 << 11
+
+_REASON_TEXT = [
+    (TREND_UP, "Trend Up (EMA)"),
+    (TREND_DOWN, "Trend Down (EMA)"),
+    (SMA_CROSS_UP, "SMA cross up"),
+    (SMA_CROSS_DOWN, "SMA cross down"),
+    (MACD_BULLISH, "MACD bullish"),
+    (MACD_BEARISH, "MACD bearish"),
+    (RSI_OVERSOLD, "RSI {rsi:.1f} oversold"),
+    (RSI_OVERBOUGHT, "RSI {rsi:.1f} overbought"),
+    (BB_BREAKOUT_UP, "BB breakout up"),
+    (BB_BREAKOUT_DOWN, "BB breakout down"),
+    (VOLUME_SPIKE, "Volume spike"),
+    (INSUFFICIENT_DATA, "insufficient_data"),
+]
+
+SIGNAL_LABELS = {1: "BUY", 0: "HOLD", -1: "SELL"}
+
+# hybrid_signal's score weights and BUY/SELL threshold
+WEIGHTS = {"trend": 0.30, "sma": 0.20, "macd": 0.15, "rsi": 0.10, "bb": 0.05, "volume": 0.05}
+THRESHOLD = 0.25
+
+
+def reason_strings(mask, rsi):
+    """hybrid_signal's reason strings for a reason bitmask, in its order."""
+    return [text.format(rsi=rsi) for flag, text in _REASON_TEXT if mask & flag]
+
+
+def signal_dict(signal, confidence, reasons, last, levels, at=None):
+    """
+    hybrid_signal's output dict.
+    signal: +1 / 0 / -1; last: indicator values of the scored bar; levels: (supports, resistances)
+    """
+    supports, resistances = levels
+    entry = float(last["close"])
+    meta = {
+        "sma9": float(last["sma9"]),
+        "sma21": float(last["sma21"]),
+        "ema_fast": float(last["ema_fast"]),
+        "ema_slow": float(last["ema_slow"]),
+        "macd": float(last["macd"]),
+        "macd_signal": float(last["macd_signal"]),
+        "rsi": float(last["rsi"]),
+        "bb_upper": float(last["bb_upper"]),
+        "bb_lower": float(last["bb_lower"]),
+        "supports": supports,
+        "resistances": resistances,
+        "last_price": entry,
+        "entry": entry,
+        "stop_loss": round(entry * 0.99, 8),
+        "take_profit": round(entry * 1.02, 8),
+        "timestamp": (at or datetime.utcnow()).isoformat()
+    }
+    return {
+        "signal": SIGNAL_LABELS[signal],
+        "confidence": round(float(confidence), 4),
+        "reasons": reasons,
+        "meta": meta
+    }
+
+
+def stack_frames(frames, symbols, timeframes, bars=None):
+    """
+    Build a (symbols, timeframes, bars, 5) float panel from {(symbol, tf): DataFrame}.
+    Shorter or missing series are left-padded with NaN; bars defaults to the longest frame.
+    """
+    if bars is None:
+        bars = max((len(df) for df in frames.values() if df is not None), default=0)
+    panel = np.full((len(symbols), len(timeframes), bars, len(OHLCV)), np.nan)
+    for i, sym in enumerate(symbols):
+        for j, tf in enumerate(timeframes):
+            df = frames.get((sym, tf))
+            if df is None or df.empty:
+                continue
+            tail = df.iloc[-bars:]
+            for k, col in enumerate(OHLCV):
+                if col in tail.columns:
+                    panel[i, j, bars - len(tail):, k] = tail[col].to_numpy(dtype=float)
+    return panel
+
+
+def _ewm(x, alpha):
+    # pandas ewm(adjust=False) along the last axis; leading NaNs (padding) stay NaN
+    out = np.empty_like(x)
+    prev = x[..., 0].copy()
+    out[..., 0] = prev
+    for t in range(1, x.shape[-1]):
+        cur = x[..., t]
+        step = (1.0 - alpha) * prev + alpha * cur
+        prev = np.where(np.isnan(prev), cur, np.where(np.isnan(cur), prev, step))
+        out[..., t] = prev
+    return out
+
+
+def _window(x, size, end):
+    # values of the `size`-bar window ending `end` bars before the last one
+    stop = x.shape[-1] - end
+    if stop < size:
+        return None
+    return x[..., stop - size:stop]
+
+
+def _rolling_last(x, size, end, fn):
+    w = _window(x, size, end)
+    if w is None:
+        return np.full(x.shape[:-1], np.nan)
+    return fn(w)
+
+
+def _mean(w):
+    return w.mean(axis=-1)
+
+def _std(w):
+    return w.std(axis=-1, ddof=1)
+
+
+def panel_indicators(panel):
+    """
+    Indicator values hybrid_signal reads, for the last two bars of every cell.
+    Returns {name: array shaped (..., 2)} with index 0 = previous bar, 1 = last bar.
+    """
+    close = panel[..., 3]
+    volume = panel[..., 4]
+    ema_fast = _ewm(close, 2.0 / 13.0)
+    ema_slow = _ewm(close, 2.0 / 27.0)
+    macd = ema_fast - ema_slow
+    macd_signal = _ewm(macd, 2.0 / 10.0)
+
+    delta = np.diff(close, axis=-1, prepend=np.nan)
+    ma_up = _ewm(np.clip(delta, 0, None), 1.0 / 14.0)[..., -2:]
+    ma_down = _ewm(-np.clip(delta, None, 0), 1.0 / 14.0)[..., -2:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = np.where(ma_down == 0, np.nan, ma_up / ma_down)
+    rsi = 100 - (100 / (1 + np.nan_to_num(rs, nan=0.0)))
+
+    def last2(size, fn, x=close):
+        return np.stack([_rolling_last(x, size, 1, fn), _rolling_last(x, size, 0, fn)], axis=-1)
+
+    bb_mid = last2(20, _mean)
+    bb_std = last2(20, _std)
+    return {
+        "close": close[..., -2:],
+        "volume": volume[..., -2:],
+        "ema_fast": ema_fast[..., -2:],
+        "ema_slow": ema_slow[..., -2:],
+        "sma9": last2(9, _mean),
+        "sma21": last2(21, _mean),
+        "rsi": rsi,
+        "macd": macd[..., -2:],
+        "macd_signal": macd_signal[..., -2:],
+        "bb_mid": bb_mid,
+        "bb_std": bb_std,
+        "bb_upper": bb_mid + 2 * bb_std,
+        "bb_lower": bb_mid - 2 * bb_std,
+        "vol_sma": last2(20, _mean, volume),
+    }
+
+
+class PanelResult:
+    """
+    Per-cell output of score_panel.
+    signal: int8 (+1 BUY, 0 HOLD, -1 SELL); confidence/score: float; reasons: uint16 bitmask
+    """
+    __slots__ = ("signal", "confidence", "score", "reasons", "indicators", "closes", "n_bars")
+
+    def __init__(self, signal, confidence, score, reasons, indicators, closes, n_bars):
+        self.signal = signal
+        self.confidence = confidence
+        self.score = score
+        self.reasons = reasons
+        self.indicators = indicators
+        self.closes = closes
+        self.n_bars = n_bars
+
+    @property
+    def shape(self):
+        return self.signal.shape
+
+    def labels(self):
+        return np.vectorize(SIGNAL_LABELS.get, otypes=[object])(self.signal)
+
+    def reason_list(self, idx):
+        return reason_strings(int(self.reasons[idx]), float(self.indicators["rsi"][idx + (1,)]))
+
+    def to_dict(self, idx, levels=None):
+        """hybrid_signal-shaped dict for one cell (idx is a tuple into the panel's leading dims)."""
+        if self.reasons[idx] & INSUFFICIENT_DATA:
+            return {"signal": "HOLD", "confidence": 0.0, "reasons": ["insufficient_data"], "meta": {}}
+        last = {k: v[idx + (1,)] for k, v in self.indicators.items()}
+        if levels is None:
+            levels = batch_levels([self._valid_closes(idx)])[0]
+        return signal_dict(int(self.signal[idx]), self.confidence[idx], self.reason_list(idx),
+                           last, levels)
+
+    def _valid_closes(self, idx):
+        closes = self.closes[idx]
+        return closes[closes.shape[-1] - int(self.n_bars[idx]):]
+
+    def to_dicts(self, symbols, timeframes):
+        """{symbol: {timeframe: hybrid_signal dict}} for a (symbols, timeframes, ...) panel."""
+        cells = [(i, j) for i in range(len(symbols)) for j in range(len(timeframes))]
+        scored = [c for c in cells if not self.reasons[c] & INSUFFICIENT_DATA]
+        levels = dict(zip(scored, batch_levels([self._valid_closes(c) for c in scored])))
+        out = {}
+        for i, j in cells:
+            out.setdefault(symbols[i], {})[timeframes[j]] = self.to_dict((i, j), levels.get((i, j)))
+        return out
+
+
+# reason bits per rule family, (bullish, bearish)
+_FAMILY_BITS = {
+    "trend": (TREND_UP, TREND_DOWN),
+    "sma": (SMA_CROSS_UP, SMA_CROSS_DOWN),
+    "macd": (MACD_BULLISH, MACD_BEARISH),
+    "rsi": (RSI_OVERSOLD, RSI_OVERBOUGHT),
+    "bb": (BB_BREAKOUT_UP, BB_BREAKOUT_DOWN),
+    "volume": (VOLUME_SPIKE, 0),
+}
+
+
+def rule_hits(last, prev, has_volume=True):
+    """
+    hybrid_signal's rule conditions as {family: (bullish mask, bearish mask)}, in scoring order.
+    The two masks of a family never overlap. sma9 / sma21 are whatever fast / slow SMAs the
+    caller passes in.
+    """
+    with np.errstate(invalid="ignore"):
+        trend_up = last["ema_fast"] > last["ema_slow"]
+        hits = {
+            "trend": (trend_up, ~trend_up),
+            "sma": ((prev["sma9"] <= prev["sma21"]) & (last["sma9"] > last["sma21"]),
+                    (prev["sma9"] >= prev["sma21"]) & (last["sma9"] < last["sma21"])),
+            "macd": ((prev["macd"] <= prev["macd_signal"]) & (last["macd"] > last["macd_signal"]),
+                     (prev["macd"] >= prev["macd_signal"]) & (last["macd"] < last["macd_signal"])),
+            "rsi": (last["rsi"] < 30, last["rsi"] > 70),
+            "bb": (last["close"] > last["bb_upper"], last["close"] < last["bb_lower"]),
+        }
+        if has_volume:
+            vol_sma = last["vol_sma"]
+            denom = np.where(vol_sma == 0, 1.0, vol_sma)
+            spike = ~np.isnan(vol_sma) & (last["volume"] > 1.5 * denom)
+            hits["volume"] = (spike, np.zeros_like(spike))
+    return hits
+
+
+def score_arrays(last, prev, n_bars, has_volume=True, weights=WEIGHTS, threshold=THRESHOLD):
+    """
+    hybrid_signal's scoring rules on arrays of any shape.
+    last / prev: {indicator: array} for the scored bar and the bar before it
+    n_bars: bars available up to the scored bar (fewer than 5 -> HOLD, insufficient_data)
+    weights / threshold: overridable for parameter sweeps; the defaults are hybrid_signal's
+    Returns (signal int8, confidence, score, reasons uint16 bitmask).
+    """
+    n_bars = np.asarray(n_bars)
+    score = np.zeros(n_bars.shape)
+    reasons = np.zeros(n_bars.shape, dtype=np.uint16)
+
+    for family, (up, down) in rule_hits(last, prev, has_volume).items():
+        w = weights[family]
+        bit_up, bit_down = _FAMILY_BITS[family]
+        score = score + np.where(up, w, 0.0) + np.where(down, -w, 0.0)
+        reasons = reasons | np.where(up, bit_up, 0).astype(np.uint16) \
+            | np.where(down, bit_down, 0).astype(np.uint16)
+
+    confidence = np.clip((score + 1.0) / 2.0, 0.0, 1.0)
+    signal = np.where(score > threshold, 1, np.where(score < -threshold, -1, 0)).astype(np.int8)
+
+    short = n_bars < 5
+    signal = np.where(short, 0, signal).astype(np.int8)
+    confidence = np.where(short, 0.0, confidence)
+    reasons = np.where(short, INSUFFICIENT_DATA, reasons).astype(np.uint16)
+    return signal, confidence, score, reasons
+
+
+def score_panel(panel, has_volume=True):
+    """
+    Vectorized hybrid_signal over a panel shaped (..., bars, 5) with OHLCV in the last axis
+    (e.g. symbols x timeframes x bars x 5 from stack_frames). Leading NaN rows are padding.
+    """
+    panel = np.asarray(panel, dtype=float)
+    n_bars = np.count_nonzero(~np.isnan(panel[..., 3]), axis=-1)
+    ind = panel_indicators(panel)
+    last = {k: v[..., 1] for k, v in ind.items()}
+    prev = {k: v[..., 0] for k, v in ind.items()}
+    signal, confidence, score, reasons = score_arrays(last, prev, n_bars, has_volume)
+    return PanelResult(signal, confidence, score, reasons, ind, panel[..., 3], n_bars)
+
+
+def score_frames(frames, symbols, timeframes, bars=None):
+    """Convenience edge: DataFrames in, {symbol: {tf: hybrid_signal dict}} out."""
+    panel = stack_frames(frames, symbols, timeframes, bars)
+    return score_panel(panel).to_dicts(symbols, timeframes)
@@ -0,0 +1,126 @@
+# pivots.py
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def _as_matrix(series_list):
+    """
+    Stack 1-D series into a (n_series, n_bars) float matrix, left-padding shorter ones with NaN.
+    A NaN inside a window never makes a pivot, so padding cannot create false pivots.
+    """
+    arrays = [np.asarray(s, dtype=float).ravel() for s in series_list]
+    width = max((len(a) for a in arrays), default=0)
+    out = np.full((len(arrays), width), np.nan)
+    for i, a in enumerate(arrays):
+        if len(a):
+            out[i, width - len(a):] = a
+    return out
+
+
+def pivot_masks(values, window=5):
+    """
+    Vectorized local extrema, same rule as rolling(window, center=True) with
+    "centre value equals the window max/min".
+    values: 1-D array, or 2-D (n_series, n_bars) to process many series at once
+    Returns (highs, lows) boolean arrays shaped like values; edges are never pivots.
+    """
+    if window < 1 or window % 2 == 0:
+        raise ValueError("window must be a positive odd number")
+    arr = np.asarray(values, dtype=float)
+    highs = np.zeros(arr.shape, dtype=bool)
+    lows = np.zeros(arr.shape, dtype=bool)
+    n = arr.shape[-1]
+    if n < window:
+        return highs, lows
+    half = window // 2
+    wins = sliding_window_view(arr, window, axis=-1)
+    centre = arr[..., half:n - half]
+    # NaN anywhere in the window -> NaN max/min -> comparison False (pandas skips those windows too)
+    with np.errstate(invalid="ignore"):
+        highs[..., half:n - half] = centre == wins.max(axis=-1)
+        lows[..., half:n - half] = centre == wins.min(axis=-1)
+    return highs, lows
+
+
+def _last_unique(values, keep):
+    # unique in order of first appearance, then the last `keep` of them (pandas .unique()[-keep:])
+    uniq, first = np.unique(values, return_index=True)
+    return list(uniq[np.argsort(first)])[-keep:]
+
+
+def cluster_levels(prices, positions=None, tolerance=0.002, keep=3):
+    """
+    Merge nearby pivot prices into levels.
+    Prices within `tolerance` (relative) of their sorted neighbour form one level, priced at
+    the cluster mean. Returns the `keep` most recently touched levels, oldest first.
+    """
+    prices = np.asarray(prices, dtype=float)
+    if prices.size == 0:
+        return []
+    if positions is None:
+        positions = np.arange(prices.size)
+    positions = np.asarray(positions)
+    order = np.argsort(prices, kind="stable")
+    p = prices[order]
+    gaps = np.diff(p) > tolerance * np.abs(p[:-1])
+    labels = np.concatenate(([0], np.cumsum(gaps)))
+    counts = np.bincount(labels)
+    means = np.bincount(labels, weights=p) / counts
+    recency = np.full(counts.size, -1, dtype=np.int64)
+    np.maximum.at(recency, labels, positions[order])
+    picked = np.argsort(recency, kind="stable")[-keep:]
+    return [np.float64(round(m, 4)) for m in means[picked]]
+
+
+def _range(closes):
+    # pandas min / max: NaNs skipped
+    with np.errstate(invalid="ignore"):
+        return float(np.nanmin(closes)), float(np.nanmax(closes))
+
+
+def levels_from_closes(closes, lookback=120, window=5, cluster=None, keep=3):
+    """
+    Support / resistance levels for one close series.
+    With cluster=None this reproduces signals.compute_support_resistance exactly;
+    pass a relative tolerance (e.g. 0.002) to merge nearby pivots instead.
+    """
+    closes = np.asarray(closes, dtype=float)[-lookback:]
+    if len(closes) < window:
+        low, high = _range(closes)
+        return [low], [high]
+    highs, lows = pivot_masks(closes, window)
+    return _levels(closes, highs, lows, cluster, keep)
+
+
+def _levels(closes, highs, lows, cluster, keep):
+    if cluster is None:
+        supports = _last_unique(np.round(closes[lows], 4), keep)
+        resistances = _last_unique(np.round(closes[highs], 4), keep)
+    else:
+        idx = np.arange(len(closes))
+        supports = cluster_levels(closes[lows], idx[lows], cluster, keep)
+        resistances = cluster_levels(closes[highs], idx[highs], cluster, keep)
+    if not supports or not resistances:
+        low, high = _range(closes)
+        supports = supports or [round(low, 4)]
+        resistances = resistances or [round(high, 4)]
+    return supports, resistances
+
+
+def batch_levels(series_list, lookback=120, window=5, cluster=None, keep=3):
+    """
+    levels_from_closes for many series at once: the pivot scan runs as one 2-D array op.
+    Returns a list of (supports, resistances), one per input series.
+    """
+    tails = [np.asarray(s, dtype=float).ravel()[-lookback:] for s in series_list]
+    highs, lows = pivot_masks(_as_matrix(tails), window)
+    width = highs.shape[-1]
+    out = []
+    for i, closes in enumerate(tails):
+        if len(closes) < window:
+            low, high = _range(closes)
+            out.append(([low], [high]))
+            continue
+        start = width - len(closes)
+        out.append(_levels(closes, highs[i, start:], lows[i, start:], cluster, keep))
+    return out
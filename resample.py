@@ -0,0 +1,80 @@
+# resample.py
+import numpy as np
+import pandas as pd
+
+from candle_store import timeframe_seconds, MAX_BARS
+
+
+def session_offset(session_start="00:00"):
+    """'09:15' -> offset in ms of the session open from midnight (bars align to it)."""
+    h, m = session_start.split(":")
+    return (int(h) * 3600 + int(m) * 60) * 1000
+
+
+def resample_ohlcv(df, timeframe, base_timeframe, offset_ms=0):
+    """
+    Aggregate a finer OHLCV frame (time, open, high, low, close, volume) into `timeframe` bars.
+    Buckets are aligned to the epoch plus offset_ms (UTC midnight for exchanges, or the session
+    open for markets like NSE). open=first, high=max, low=min, close=last, volume=sum.
+
+    Returns (frame, complete) where complete[i] says bucket i holds every base bar it should.
+    """
+    tf_ms = timeframe_seconds(timeframe) * 1000
+    per_bucket = tf_ms // (timeframe_seconds(base_timeframe) * 1000)
+    t = pd.DatetimeIndex(df["time"]).as_unit("ms").asi8
+    bucket = (t - offset_ms) // tf_ms
+    starts = np.flatnonzero(np.r_[True, np.diff(bucket) != 0])
+    ends = np.r_[starts[1:], len(t)] - 1
+    counts = ends - starts + 1
+    out = pd.DataFrame({
+        "time": pd.to_datetime(bucket[starts] * tf_ms + offset_ms, unit="ms"),
+        "open": df["open"].to_numpy(dtype=float)[starts],
+        "high": np.maximum.reduceat(df["high"].to_numpy(dtype=float), starts),
+        "low": np.minimum.reduceat(df["low"].to_numpy(dtype=float), starts),
+        "close": df["close"].to_numpy(dtype=float)[ends],
+        "volume": np.add.reduceat(df["volume"].to_numpy(dtype=float), starts),
+    })
+    return out, counts == per_bucket
+
+
+def derive(df, timeframe, base_timeframe, limit, offset_ms=0):
+    """
+    Last `limit` bars of `timeframe` built from base bars, or None when the base history
+    can't cover them exactly (too short, or a gap inside the window). The last bar may be
+    partial: it is the still-forming candle, same as a direct fetch returns.
+    """
+    if df is None or df.empty:
+        return None
+    out, complete = resample_ohlcv(df, timeframe, base_timeframe, offset_ms)
+    # the first bucket is usually cut off by the start of the history
+    if not complete[0]:
+        out, complete = out.iloc[1:], complete[1:]
+    if len(out) < limit:
+        return None
+    out, complete = out.iloc[-limit:], complete[-limit:]
+    tf_ms = timeframe_seconds(timeframe) * 1000
+    steps = np.diff(pd.DatetimeIndex(out["time"]).as_unit("ms").asi8)
+    if not complete[:-1].all() or (steps != tf_ms).any():
+        return None
+    return out.reset_index(drop=True)
+
+
+def plan(timeframes, base_timeframe, limit, max_bars=MAX_BARS):
+    """
+    Split timeframes into (derived, direct): derived ones are exact multiples of the base
+    whose `limit`-bar window fits in the cached base history; the rest are fetched directly.
+    Also returns how many base bars the derived set needs.
+    """
+    base_s = timeframe_seconds(base_timeframe)
+    derived, direct, need = [], [], limit
+    for tf in timeframes:
+        if tf == base_timeframe:
+            continue
+        s = timeframe_seconds(tf)
+        bars = limit * s // base_s + s // base_s
+        if s % base_s == 0 and bars <= max_bars:
+            derived.append(tf)
+            need = max(need, bars)
+        else:
+            direct.append(tf)
+    return derived, direct, need
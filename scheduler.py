@@ -0,0 +1,131 @@
+# scheduler.py
+"""
+Long-running replacement for the every-5-minutes cron: wakes at each candle close and
+rescores only the (symbol, timeframe) pairs whose bar just closed.
+
+    python scheduler.py        # FETCH_MODE=async (default) or sync, as signal_worker
+    SHARD_COUNT=2 SHARD_INDEX=1 WORKER_PROCESSES=4 python scheduler.py   # see universe.py
+"""
+import os
+import math
+import time
+import asyncio
+from functools import reduce
+from datetime import datetime, timezone
+
+from apscheduler.events import EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED
+from apscheduler.triggers.interval import IntervalTrigger
+
+import signal_worker as sw
+import universe
+from candle_store import timeframe_seconds
+from metrics import CYCLE_SECONDS, SCHEDULE_LAG, SCHEDULE_SKIPPED, serve
+
+# seconds after the close before fetching, so the exchange has finalised the bar
+CLOSE_DELAY = float(os.getenv("SCHEDULE_CLOSE_DELAY", "2"))
+
+
+def tick_seconds(timeframes):
+    """Spacing of candle closes across all timeframes (every close of every tf is a tick)."""
+    return reduce(math.gcd, (timeframe_seconds(tf) for tf in timeframes))
+
+
+def closed_timeframes(timeframes, boundary):
+    """Timeframes with a candle closing at `boundary` (epoch s; closes align to the epoch, UTC)."""
+    return [tf for tf in timeframes if boundary % timeframe_seconds(tf) == 0]
+
+
+def current_boundary(tick, now=None):
+    """The candle close the run starting at `now` belongs to."""
+    now = time.time() if now is None else now
+    return int((now - CLOSE_DELAY) // tick * tick)
+
+
+def _start(boundary, now):
+    lag = now - (boundary + CLOSE_DELAY)
+    SCHEDULE_LAG.observe(max(lag, 0.0))
+    return closed_timeframes(sw.timeframes, boundary)
+
+
+def run_tick(tick):
+    now = time.time()
+    boundary = current_boundary(tick, now)
+    tfs = _start(boundary, now)
+    with CYCLE_SECONDS.labels("scheduler").time():
+        sw.run_cycle(tfs, boundary * 1000)
+        sw.writes.flush()
+    sw.state.save()
+    print(f"⏱️ {datetime.fromtimestamp(boundary, timezone.utc):%H:%M} close: {tfs}")
+
+
+async def run_tick_async(client, tick):
+    now = time.time()
+    boundary = current_boundary(tick, now)
+    tfs = _start(boundary, now)
+    with CYCLE_SECONDS.labels("scheduler").time():
+        await sw.run_cycle_async(client, tfs, boundary * 1000)
+        sw.writes.flush()
+    sw.state.save()
+    print(f"⏱️ {datetime.fromtimestamp(boundary, timezone.utc):%H:%M} close: {tfs}")
+
+
+def _on_skip(event):
+    reason = "overlap" if event.code == EVENT_JOB_MAX_INSTANCES else "missed"
+    SCHEDULE_SKIPPED.labels(reason).inc()
+    when = getattr(event, "scheduled_run_time", None) or event.scheduled_run_times[0]
+    print(f"⚠️ Skipped run at {when:%H:%M:%S} ({reason})")
+
+
+def configure(scheduler, job, tick, args=()):
+    """
+    One interval job per tick, aligned to the epoch so it fires CLOSE_DELAY after each close.
+    A run still going when the next tick comes up makes that tick skip (max_instances=1).
+    """
+    first = (math.floor(time.time() / tick) + 1) * tick + CLOSE_DELAY
+    trigger = IntervalTrigger(seconds=tick,
+                              start_date=datetime.fromtimestamp(first, timezone.utc),
+                              timezone=timezone.utc)
+    scheduler.add_job(job, trigger, args=args, id="candle-close", max_instances=1,
+                      coalesce=True, misfire_grace_time=max(1, tick // 2))
+    scheduler.add_listener(_on_skip, EVENT_JOB_MAX_INSTANCES | EVENT_JOB_MISSED)
+    return scheduler
+
+
+def main(proc=0, procs=1):
+    sw.use_slice(proc, procs)
+    serve(sw.METRICS_PORT + proc if sw.METRICS_PORT else 0)
+    tick = tick_seconds(sw.timeframes)
+    # one full pass first so every timeframe has a vote before its own next close
+    boundary = current_boundary(tick)
+    print(f"🕐 Scheduler: tick {tick}s, timeframes {sw.timeframes}, symbols {sw.symbols}")
+
+    if os.getenv("FETCH_MODE", "async") == "async":
+        from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+        async def run():
+            client = sw.async_exchange("binance")
+            try:
+                await sw.run_cycle_async(client, None, boundary * 1000)
+                sw.writes.flush()
+                configure(AsyncIOScheduler(timezone=timezone.utc), run_tick_async, tick,
+                          (client, tick)).start()
+                await asyncio.Event().wait()
+            finally:
+                sw.writes.close()
+                sw.state.close()
+                await client.close()
+        asyncio.run(run())
+    else:
+        from apscheduler.schedulers.blocking import BlockingScheduler
+        try:
+            sw.run_cycle(None, boundary * 1000)
+            sw.writes.flush()
+            configure(BlockingScheduler(timezone=timezone.utc), run_tick, tick, (tick,)).start()
+        finally:
+            sw.writes.close()
+            sw.state.close()
+
+
+if __name__ == "__main__":
+    # one scheduler per process, each over its own slice of this node's symbols
+    raise SystemExit(universe.run_processes(main))
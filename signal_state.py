@@ -0,0 +1,151 @@
+# signal_state.py
+import os
+import json
+import time
+import threading
+
+from metrics import SIGNAL_CHANGES
+
+# minimum confidence move that counts as a change on its own
+CONFIDENCE_DELTA = float(os.getenv("SIGNAL_CONFIDENCE_DELTA", "0.1"))
+# re-emit an unchanged signal after this many seconds; 0 = never
+HEARTBEAT = float(os.getenv("SIGNAL_HEARTBEAT", "0"))
+# snapshots are written at most this often (and always on close())
+SAVE_INTERVAL = float(os.getenv("SIGNAL_STATE_SAVE_INTERVAL", "30"))
+
+
+class FileSnapshot:
+    """State snapshot as a JSON file, replaced atomically."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def save(self, data):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+
+class FirestoreSnapshot:
+    """State snapshot as one Firestore document (survives restarts on a fresh host)."""
+
+    def __init__(self, db, collection="state", doc_id="signals"):
+        self.db = db
+        self.collection = collection
+        self.doc_id = doc_id
+
+    @property
+    def ref(self):
+        # resolved per call: creating the snapshot must not touch a (lazy) client
+        return self.db.collection(self.collection).document(self.doc_id)
+
+    def load(self):
+        snap = self.ref.get()
+        return (snap.to_dict() or {}).get("last", {}) if snap.exists else {}
+
+    def save(self, data):
+        self.ref.set({"last": data})
+
+
+class SignalState:
+    """
+    Last emitted signal per (symbol, interval). check() says whether a new reading is worth
+    persisting / notifying: a new key, a signal transition, a confidence move of at least
+    `threshold`, or (if `heartbeat` is set) an unchanged signal not emitted for that long.
+    The snapshot is loaded on first use and written by save() / close().
+    """
+
+    def __init__(self, snapshot=None, threshold=CONFIDENCE_DELTA, heartbeat=HEARTBEAT,
+                 save_interval=SAVE_INTERVAL):
+        self.snapshot = snapshot
+        self.threshold = threshold
+        self.heartbeat = heartbeat
+        self.save_interval = save_interval
+        self.emitted = 0
+        self.suppressed = 0
+        self._last = None
+        self._dirty = False
+        self._saved_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._last is None:
+            data = {}
+            if self.snapshot is not None:
+                try:
+                    data = self.snapshot.load()
+                except Exception as e:
+                    print(f"⚠️ Failed to load signal state: {e}")
+            self._last = {k: tuple(v) for k, v in data.items()}
+        return self._last
+
+    def check(self, symbol, interval, signal, confidence=None, now=None, record=True):
+        """
+        Returns why the reading should be emitted ("new", "transition", "confidence", "heartbeat"),
+        or None. record=False leaves the state as it is: call record() once the signal is delivered.
+        """
+        now = time.time() if now is None else now
+        key = f"{symbol}|{interval}"
+        with self._lock:
+            last = self._load()
+            prev = last.get(key)
+            if prev is None:
+                reason = "new"
+            elif prev[0] != signal:
+                reason = "transition"
+            elif confidence is not None and prev[1] is not None \
+                    and abs(confidence - prev[1]) >= self.threshold:
+                reason = "confidence"
+            elif self.heartbeat and now - prev[2] >= self.heartbeat:
+                reason = "heartbeat"
+            else:
+                self.suppressed += 1
+                SIGNAL_CHANGES.labels("suppressed").inc()
+                return None
+            if record:
+                last[key] = (signal, confidence, now)
+                self._dirty = True
+            self.emitted += 1
+        SIGNAL_CHANGES.labels(reason).inc()
+        return reason
+
+    def record(self, symbol, interval, signal, confidence=None, now=None):
+        """Store a reading as emitted (after check(..., record=False) and a successful delivery)."""
+        with self._lock:
+            self._load()[f"{symbol}|{interval}"] = (signal, confidence,
+                                                    time.time() if now is None else now)
+            self._dirty = True
+
+    def save(self, force=False):
+        if self.snapshot is None:
+            return False
+        with self._lock:
+            if not self._dirty or (not force and time.time() - self._saved_at < self.save_interval):
+                return False
+            data = {k: list(v) for k, v in self._last.items()}
+            self._dirty = False
+            self._saved_at = time.time()
+        try:
+            self.snapshot.save(data)
+            return True
+        except Exception as e:
+            print(f"⚠️ Failed to save signal state: {e}")
+            with self._lock:
+                self._dirty = True
+            return False
+
+    def close(self):
+        return self.save(force=True)
+
+    def stats(self):
+        return {"keys": len(self._last or {}), "emitted": self.emitted,
+                "suppressed": self.suppressed}
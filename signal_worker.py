@@ -1,64 +1,279 @@
 # signal_worker.py
-import ccxt
 import pandas as pd
+import os
 import time
-import firebase_admin
-from firebase_admin import credentials, firestore
+import asyncio
+import universe
 from signals import hybrid_signal   # your strategy file
+from incremental import IndicatorEngine
+from candle_store import ccxt_fetch
+from async_fetch import fetch_stream, async_exchange
+from resample import plan, derive
+from write_buffer import WriteBuffer, firestore_writer
+from signal_state import SignalState, FirestoreSnapshot
+from metrics import CYCLE_SECONDS, SCORED, SIGNALS, serve, stage
+from firebase_app import db  # 🔑 Firebase is initialised on the first write
 
-# 🔑 Firebase setup
-cred = credentials.Certificate("serviceAccount.json")
-firebase_admin.initialize_app(cred)
-db = firestore.client()
+# last published decision per symbol: unchanged decisions are not written again
+# (SIGNAL_HEARTBEAT re-publishes them periodically if set)
+state = SignalState(FirestoreSnapshot(db, "state", f"signal_worker{universe.label()}"))
 
-# Exchange setup (Binance)
-exchange = ccxt.binance()
+def recorded(write):
+    """Flush function wrapper: decisions go into `state` only once their docs are committed."""
+    def flush(docs):
+        res = write(docs)
+        for doc in docs:
+            state.record(doc["symbol"], "vote", doc["type"])
+        return res
+    return flush
 
-symbols = ["BTC/USDT", "ETH/USDT", "SOL/USDT"]
-timeframes = ["1m", "5m", "15m", "1h", "1d"]
+# signal docs are committed in batches: at 100 docs, 5s after the oldest, or at cycle end.
+# A decision whose commit fails stays unrecorded, so the next cycle publishes it again
+writes = WriteBuffer(recorded(firestore_writer(db, "signals")), flush_size=100,
+                     flush_interval=5.0)
 
-def fetch_candles(symbol, tf="5m", limit=120):
-    ohlcv = exchange.fetch_ohlcv(symbol, tf, limit=limit)
-    df = pd.DataFrame(ohlcv, columns=["time","open","high","low","close","volume"])
-    df["time"] = pd.to_datetime(df["time"], unit="ms")
-    return df
+# Prometheus /metrics (and /debug/profile with PROFILER_ENABLED=1) for this worker; 0 disables
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+# Exchange setup (Binance), created on the first fetch (importing ccxt is slow)
+exchange = None
+
+def get_exchange():
+    global exchange
+    if exchange is None:
+        import ccxt
+        exchange = ccxt.binance()
+    return exchange
+
+# the crypto entries of symbols.json as Binance pairs. Nodes own whole symbols (SHARD_INDEX of
+# SHARD_COUNT), so a symbol's timeframes are resampled and voted on in one place
+crypto = [dict(e, symbol=universe.ccxt_symbol(e["symbol"]))
+          for e in universe.load(categories=["crypto"])]
+intervals = {e["symbol"]: e["intervals"] for e in crypto}
+node_symbols = universe.shard(list(intervals))
+symbols = list(node_symbols)
+# every timeframe any entry uses, so the plan and the schedule are the same on every node
+timeframes = universe.sort_timeframes(tf for e in crypto for tf in e["intervals"])
+
+LIMIT = 150
+
+# 5m/15m/1h are resampled from the cached 1m history; only what it can't cover (1d) is
+# fetched directly, so a warm cycle makes ~2 requests per symbol instead of 5
+BASE_TF = "1m"
+derived_tfs, direct_tfs, base_history = plan(timeframes, BASE_TF, LIMIT)
+# one page per cycle; a cold or short cache is backfilled backwards to base_history first
+BASE_FETCH_LIMIT = min(base_history, 1000)
+
+# indicator state per (symbol, timeframe), kept across cycles
+engine = IndicatorEngine()
+
+# last signal per symbol and timeframe, so a cycle that only rescored the timeframes whose
+# candle closed still votes across all of them
+latest = {}
+
+def use_slice(proc, procs):
+    """Narrow this process to its share of the node's symbols (see universe.run_processes)."""
+    global symbols, state
+    symbols = universe.local(node_symbols, proc, procs)
+    state = SignalState(FirestoreSnapshot(db, "state",
+                                          f"signal_worker{universe.label(proc, procs)}"))
+
+def fetch_candles(symbol, tf="5m", limit=120, history=None):
+    # cached: fetch_ohlcv(since=last stored bar) and merge over the forming candle
+    with stage("fetch"):
+        return ccxt_fetch(get_exchange(), symbol, tf, limit=limit, history=history)
+
+def closed_bars(df, closed_at):
+    """Drop the candle that opened at closed_at (epoch ms) or later: it has barely started."""
+    if closed_at is None or df is None:
+        return df
+    return df[df["time"] < pd.Timestamp(closed_at, unit="ms")].reset_index(drop=True)
+
+def cycle_timeframes(tfs=None):
+    """(timeframes to score, the ones that come from the base history) for a cycle."""
+    active = [tf for tf in timeframes if tfs is None or tf in tfs]
+    from_base = [tf for tf in active if tf == BASE_TF or tf in derived_tfs]
+    return active, from_base
+
+def symbol_timeframes(symbol, active):
+    """The cycle's timeframes that symbols.json lists for this symbol (all of them if it isn't listed)."""
+    wanted = intervals.get(symbol)
+    return active if wanted is None else [tf for tf in active if tf in wanted]
+
+def expand_base(base):
+    """{tf: frame} for the base timeframe and every derived one its history fully covers."""
+    frames = {tf: derive(base, tf, BASE_TF, LIMIT) for tf in derived_tfs}
+    if BASE_TF in timeframes:
+        frames[BASE_TF] = base.iloc[-LIMIT:].reset_index(drop=True)
+    return {tf: df for tf, df in frames.items() if df is not None}
+
+def score(symbol, tf, df):
+    SCORED.labels(tf).inc()
+    with stage("indicators"):
+        state = engine.sync(symbol, tf, df)
+    with stage("score"):
+        return hybrid_signal(state)
+
+def publish(symbol, scored):
+    """
+    scored: {tf: (sig, df)} for the timeframes that succeeded this cycle; timeframes not
+    rescored vote with their last signal.
+    Majority vote across timeframes, saved as one signals doc.
+    """
+    if not scored:
+        return
+    votes = latest.setdefault(symbol, {})
+    votes.update(scored)
+    results = []
+    reasons = []
+    for tf in timeframes:
+        if tf not in votes:
+            continue
+        sig, _ = votes[tf]
+        results.append(sig["signal"])
+        reasons.extend([f"{tf}:{r}" for r in sig["reasons"]])
+
+    if not results:
+        return
+
+    # majority vote across timeframes
+    decision = max(set(results), key=results.count)
+    change = state.check(symbol, "vote", decision, record=False)
+    if change is None:
+        return
+
+    # last price from the finest timeframe scored this cycle (older frames may be stale)
+    df = next(scored[tf][1] for tf in timeframes if tf in scored)
+    price = float(df["close"].iloc[-1])
+
+    signal_doc = {
+        "symbol": symbol,
+        "type": decision,
+        "price": price,
+        "time": int(time.time()*1000),
+        "reasons": results,
+        "details": reasons,
+        "change": change
+    }
+
+    writes.add(signal_doc)
+    SIGNALS.labels(decision).inc()
+    print(f"📢 {symbol} → {decision} @ {price} ({results})")
+
+def run_cycle(tfs=None, closed_at=None):
+    """
+    Fetch, score and publish every symbol.
+    tfs: only fetch / score these timeframes (default all of them)
+    closed_at: epoch ms of the candle close this cycle runs for; later bars are dropped
+    """
+    active, from_base = cycle_timeframes(tfs)
+    for symbol in symbols:
+        want = symbol_timeframes(symbol, active)
+        frames = {}
+        if any(tf in from_base for tf in want):
+            try:
+                base = fetch_candles(symbol, BASE_TF, BASE_FETCH_LIMIT, base_history)
+                frames = expand_base(closed_bars(base, closed_at))
+            except Exception as e:
+                print(f"⚠️ Error fetching {symbol} {BASE_TF}: {e}")
+
+        scored = {}
+        for tf in want:
+            try:
+                df = frames.get(tf)
+                if df is None:
+                    df = closed_bars(fetch_candles(symbol, tf, limit=LIMIT), closed_at)
+                scored[tf] = (score(symbol, tf, df), df)
+            except Exception as e:
+                print(f"⚠️ Error fetching {symbol} {tf}: {e}")
+        publish(symbol, scored)
+
+async def run_cycle_async(client, tfs=None, closed_at=None):
+    # all fetches in flight at once; each result is scored as it lands and a symbol is
+    # published as soon as its last timeframe is in (tfs / closed_at as in run_cycle)
+    active, from_base = cycle_timeframes(tfs)
+    direct = [tf for tf in active if tf not in from_base]
+    want = {symbol: symbol_timeframes(symbol, active) for symbol in symbols}
+    pending = {symbol: {} for symbol in symbols}
+    done = {symbol: 0 for symbol in symbols}
+    retry = []
+
+    def accept(symbol, tf, df):
+        done[symbol] += 1
+        if isinstance(df, Exception):
+            print(f"⚠️ Error fetching {symbol} {tf}: {df}")
+        else:
+            try:
+                df = closed_bars(df, closed_at)
+                pending[symbol][tf] = (score(symbol, tf, df), df)
+            except Exception as e:
+                print(f"⚠️ Error scoring {symbol} {tf}: {e}")
+        if done[symbol] == len(want[symbol]):
+            publish(symbol, pending.pop(symbol))
+
+    pairs = []
+    for symbol in symbols:
+        if any(tf in from_base for tf in want[symbol]):
+            pairs.append((symbol, BASE_TF))
+        pairs += [(symbol, tf) for tf in direct if tf in want[symbol]]
+    limits = {BASE_TF: BASE_FETCH_LIMIT, **{tf: LIMIT for tf in direct}}
+    async for symbol, tf, df in fetch_stream(client, pairs, limit=limits,
+                                             history={BASE_TF: base_history}):
+        if tf != BASE_TF:
+            accept(symbol, tf, df)
+            continue
+        frames = {}
+        if isinstance(df, Exception):
+            print(f"⚠️ Error fetching {symbol} {tf}: {df}")
+        else:
+            frames = expand_base(closed_bars(df, closed_at))
+        for t in from_base:
+            if t not in want[symbol]:
+                continue
+            if t in frames:
+                accept(symbol, t, frames[t])
+            else:
+                retry.append((symbol, t))
+
+    # windows the base history could not cover yet: fetch them directly
+    if retry:
+        async for symbol, tf, df in fetch_stream(client, retry, limit=LIMIT):
+            accept(symbol, tf, df)
 
 def run_signals():
-    while True:
-        for symbol in symbols:
-            results = []
-            decision = "HOLD"
-            reasons = []
-
-            for tf in timeframes:
-                try:
-                    df = fetch_candles(symbol, tf, limit=150)
-                    sig = hybrid_signal(df)
-                    results.append(sig["signal"])
-                    reasons.extend([f"{tf}:{r}" for r in sig["reasons"]])
-                except Exception as e:
-                    print(f"⚠️ Error fetching {symbol} {tf}: {e}")
-
-            if results:
-                # majority vote across timeframes
-                decision = max(set(results), key=results.count)
-
-                # get last price from the last dataframe
-                price = float(df["close"].iloc[-1])
-
-                signal_doc = {
-                    "symbol": symbol,
-                    "type": decision,
-                    "price": price,
-                    "time": int(time.time()*1000),
-                    "reasons": results,
-                    "details": reasons
-                }
-
-                db.collection("signals").add(signal_doc)
-                print(f"📢 {symbol} → {decision} @ {price} ({results})")
-
-        time.sleep(60)  # run every 1 min
+    try:
+        while True:
+            with CYCLE_SECONDS.labels("signal_worker").time():
+                run_cycle()
+                writes.flush()
+            state.save()
+            time.sleep(60)  # run every 1 min
+    finally:
+        writes.close()
+        state.close()
+
+async def run_signals_async():
+    client = async_exchange("binance")
+    try:
+        while True:
+            with CYCLE_SECONDS.labels("signal_worker").time():
+                await run_cycle_async(client)
+                writes.flush()
+            state.save()
+            await asyncio.sleep(60)  # run every 1 min
+    finally:
+        writes.close()
+        state.close()
+        await client.close()
+
+def main(proc=0, procs=1):
+    use_slice(proc, procs)
+    serve(METRICS_PORT + proc if METRICS_PORT else 0)
+    if os.getenv("FETCH_MODE", "async") == "async":
+        asyncio.run(run_signals_async())
+    else:
+        run_signals()
 
 if __name__ == "__main__":
-    run_signals()
+    # WORKER_PROCESSES > 1 splits this node's symbols over that many processes
+    raise SystemExit(universe.run_processes(main))
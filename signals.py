@@ -2,6 +2,7 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime
+from pivots import levels_from_closes
 
 def add_indicators(df):
     df = df.copy()
@@ -34,39 +35,54 @@ def add_indicators(df):
         df['vol_sma'] = df['volume'].rolling(20).mean()
     return df
 
-def compute_support_resistance(df, lookback=120):
-    closes = df['close'].iloc[-lookback:]
-    if len(closes) < 5:
-        return [float(closes.min())], [float(closes.max())]
-    # find local minima/maxima using rolling window
-    highs = closes.rolling(5, center=True).apply(lambda x: 1 if x[2]==x.max() else 0, raw=True)
-    lows  = closes.rolling(5, center=True).apply(lambda x: 1 if x[2]==x.min() else 0, raw=True)
-    supports = list(closes[lows==1].round(4).unique())[-3:]
-    resistances = list(closes[highs==1].round(4).unique())[-3:]
-    if not supports:
-        supports = [round(float(closes.min()),4)]
-    if not resistances:
-        resistances = [round(float(closes.max()),4)]
-    return supports, resistances
+def compute_support_resistance(df, lookback=120, window=5, cluster=None):
+    """
+    Last 3 support / resistance levels from local pivots of the close.
+    cluster: optional relative tolerance (e.g. 0.002) to merge nearby pivots into levels
+    """
+    return levels_from_closes(df['close'], lookback, window, cluster)
 
 def hybrid_signal(df):
     """
     Input: pandas DataFrame with columns open, high, low, close, volume (index datetime)
+           or an incremental.IndicatorState that is already up to date
     Output: dict with signal, confidence, reasons, meta
     """
+    if not isinstance(df, pd.DataFrame):
+        return _state_signal(df)
+
     df = df.copy()
     df = add_indicators(df)
     if len(df) < 5:
-        return {
-            "signal": "HOLD",
-            "confidence": 0.0,
-            "reasons": ["insufficient_data"],
-            "meta": {}
-        }
+        return _insufficient()
 
     last = df.iloc[-1]
     prev = df.iloc[-2]
+    return _score(last, prev, 'volume' in df.columns,
+                  lambda: compute_support_resistance(df))
+
+def _state_signal(state):
+    # same scoring as the DataFrame path, fed from the incremental engine's last two rows
+    if len(state) < 5:
+        return _insufficient()
+    prev, last = state.last_rows()
+    return _score(last, prev, state.has_volume,
+                  lambda: levels_from_closes(state.close_series()))
+
+def _insufficient():
+    return {
+        "signal": "HOLD",
+        "confidence": 0.0,
+        "reasons": ["insufficient_data"],
+        "meta": {}
+    }
 
+def _score(last, prev, has_volume, levels):
+    """
+    Score the last bar against the previous one.
+    last/prev: row mappings (pandas Series or dict) holding the add_indicators columns
+    levels: callable returning (supports, resistances), only evaluated once scoring is done
+    """
     score = 0.0
     reasons = []
 
@@ -112,7 +128,7 @@ def hybrid_signal(df):
         reasons.append("BB breakout down")
 
     # Volume spike adds confidence (if volume available)
-    if 'volume' in df.columns and not np.isnan(last.get('vol_sma', np.nan)):
+    if has_volume and not np.isnan(last.get('vol_sma', np.nan)):
         if last['volume'] > 1.5 * (last.get('vol_sma') or 1):
             score += 0.05
             reasons.append("Volume spike")
@@ -127,7 +143,7 @@ def hybrid_signal(df):
     else:
         signal = "HOLD"
 
-    supports, resistances = compute_support_resistance(df)
+    supports, resistances = levels()
 
     entry = float(last['close'])
     stop_loss = round(entry * 0.99, 8)   # default 1% SL (heuristic)
@@ -0,0 +1,273 @@
+# sweep.py
+import os
+import time
+import random
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from panel import WEIGHTS, THRESHOLD, rule_hits
+from backtest import simulate
+
+# hybrid_signal's hardcoded parameters; every sweep axis falls back to these
+DEFAULTS = {
+    "ema_fast": 12, "ema_slow": 26, "macd_signal": 9,
+    "sma_fast": 9, "sma_slow": 21,
+    "rsi_com": 13,
+    "bb_window": 20, "bb_k": 2.0,
+    **{f"w_{k}": v for k, v in WEIGHTS.items()},
+    "threshold": THRESHOLD,
+}
+# parameters that change indicator values; the rest (weights, threshold) only rescore them
+WINDOW_KEYS = ("ema_fast", "ema_slow", "macd_signal", "sma_fast", "sma_slow", "rsi_com",
+               "bb_window", "bb_k")
+FAMILIES = tuple(WEIGHTS)
+
+MAX_WORKERS = int(os.getenv("SWEEP_WORKERS", str(os.cpu_count() or 1)))
+
+
+def grid(**axes):
+    """Cartesian product of the given axes over DEFAULTS, e.g. grid(ema_fast=[8, 12], threshold=[0.2, 0.3])."""
+    keys = list(axes)
+    sets = (_valid({**DEFAULTS, **dict(zip(keys, combo))})
+            for combo in itertools.product(*(axes[k] for k in keys)))
+    return [p for p in sets if p]
+
+
+def sample(space, n, seed=None):
+    """n random parameter sets; each axis in `space` is a list of choices (others stay default)."""
+    rng = random.Random(seed)
+    seen, out = set(), []
+    for _ in range(n * 20):
+        params = _valid({**DEFAULTS, **{k: rng.choice(v) for k, v in space.items()}})
+        if params is None:
+            continue
+        key = tuple(sorted(params.items()))
+        if key not in seen:
+            seen.add(key)
+            out.append(params)
+            if len(out) == n:
+                break
+    return out
+
+
+def _valid(params):
+    if params["ema_fast"] >= params["ema_slow"] or params["sma_fast"] >= params["sma_slow"]:
+        return None
+    return params
+
+
+class Families:
+    """
+    Indicator families for one symbol, each computed once for every window the sweep needs:
+    EMAs of the close as one (spans x bars) matrix, rolling means / stds likewise, RSI per com.
+    MACD signal lines depend on three windows and are built on first use.
+    """
+
+    def __init__(self, df, params):
+        close = df["close"].astype(float)
+        self.close = close.to_numpy()
+        self.high = df["high"].to_numpy(dtype=float) if "high" in df.columns else self.close
+        self.low = df["low"].to_numpy(dtype=float) if "low" in df.columns else self.close
+        self.has_volume = "volume" in df.columns
+        if self.has_volume:
+            self.volume = df["volume"].to_numpy(dtype=float)
+            self.vol_sma = df["volume"].rolling(20).mean().to_numpy()
+
+        spans = sorted({p[k] for p in params for k in ("ema_fast", "ema_slow")})
+        windows = sorted({p[k] for p in params for k in ("sma_fast", "sma_slow", "bb_window")})
+        std_windows = sorted({p["bb_window"] for p in params})
+        coms = sorted({p["rsi_com"] for p in params})
+
+        self.ema_row = {s: i for i, s in enumerate(spans)}
+        self.ema = np.vstack([close.ewm(span=s, adjust=False).mean().to_numpy() for s in spans])
+        self.sma_row = {w: i for i, w in enumerate(windows)}
+        self.sma = np.vstack([close.rolling(w).mean().to_numpy() for w in windows])
+        self.std_row = {w: i for i, w in enumerate(std_windows)}
+        self.std = np.vstack([close.rolling(w).std().to_numpy() for w in std_windows])
+
+        delta = close.diff()
+        up, down = delta.clip(lower=0), -delta.clip(upper=0)
+        self.rsi = {}
+        for com in coms:
+            rs = up.ewm(com=com, adjust=False).mean() / \
+                down.ewm(com=com, adjust=False).mean().replace(0, np.nan)
+            self.rsi[com] = (100 - (100 / (1 + rs.fillna(0)))).to_numpy()
+        self._macd = {}
+
+    def __len__(self):
+        return len(self.close)
+
+    def macd(self, fast, slow, signal):
+        key = (fast, slow, signal)
+        if key not in self._macd:
+            macd = self.ema[self.ema_row[fast]] - self.ema[self.ema_row[slow]]
+            line = pd.Series(macd).ewm(span=signal, adjust=False).mean().to_numpy()
+            self._macd[key] = (macd, line)
+        return self._macd[key]
+
+    def columns(self, p):
+        """The add_indicators columns hybrid_signal scores, for parameter set p."""
+        mid = self.sma[self.sma_row[p["bb_window"]]]
+        std = self.std[self.std_row[p["bb_window"]]]
+        macd, macd_signal = self.macd(p["ema_fast"], p["ema_slow"], p["macd_signal"])
+        cols = {
+            "close": self.close,
+            "ema_fast": self.ema[self.ema_row[p["ema_fast"]]],
+            "ema_slow": self.ema[self.ema_row[p["ema_slow"]]],
+            "sma9": self.sma[self.sma_row[p["sma_fast"]]],
+            "sma21": self.sma[self.sma_row[p["sma_slow"]]],
+            "rsi": self.rsi[p["rsi_com"]],
+            "macd": macd,
+            "macd_signal": macd_signal,
+            "bb_upper": mid + p["bb_k"] * std,
+            "bb_lower": mid - p["bb_k"] * std,
+        }
+        if self.has_volume:
+            cols["volume"] = self.volume
+            cols["vol_sma"] = self.vol_sma
+        return cols
+
+    def signals(self, p, weight_sets):
+        """
+        Per-bar signals (bars x len(weight_sets)) for the windows of p. Rule hits are computed
+        once and rescored for every weight / threshold set, summed in hybrid_signal's order.
+        """
+        last = self.columns(p)
+        prev = {c: np.r_[np.nan, v[:-1]] for c, v in last.items()}
+        hits = rule_hits(last, prev, self.has_volume)
+        w = np.array([[ws[f"w_{f}"] for f in FAMILIES] for ws in weight_sets])
+        score = np.zeros((len(self), len(weight_sets)))
+        for j, family in enumerate(FAMILIES):
+            if family in hits:
+                up, down = hits[family]
+                score = score + np.where(up[:, None], w[:, j], 0.0) + np.where(down[:, None], -w[:, j], 0.0)
+        threshold = np.array([ws["threshold"] for ws in weight_sets])
+        signal = np.where(score > threshold, 1, np.where(score < -threshold, -1, 0)).astype(np.int8)
+        signal[:4] = 0  # hybrid_signal needs 5 bars
+        return signal
+
+
+# ---------- process pool ----------
+_families = None
+_exits = None
+
+
+def _init(families, exits):
+    global _families, _exits
+    _families, _exits = families, exits
+
+
+def _evaluate(group):
+    """Backtest one window setting with all its weight / threshold sets over every symbol."""
+    window, weight_sets = group
+    p = {**DEFAULTS, **dict(zip(WINDOW_KEYS, window))}
+    totals = [_Totals() for _ in weight_sets]
+    for fam in _families.values():
+        signals = fam.signals(p, weight_sets)
+        for k, tot in enumerate(totals):
+            trades, equity = simulate(fam.close, fam.high, fam.low, signals[:, k], None, **_exits)
+            tot.add(trades, equity)
+    return [{**p, **ws, **tot.stats()} for ws, tot in zip(weight_sets, totals)]
+
+
+class _Totals:
+    __slots__ = ("returns", "trade_rets", "drawdown")
+
+    def __init__(self):
+        self.returns, self.trade_rets, self.drawdown = [], [], 0.0
+
+    def add(self, trades, equity):
+        eq = equity.to_numpy()
+        self.returns.append(eq[-1] - 1 if len(eq) else 0.0)
+        self.trade_rets.append(trades["return"].to_numpy(dtype=float))
+        if len(eq):
+            self.drawdown = min(self.drawdown, float((eq / np.maximum.accumulate(eq) - 1).min()))
+
+    def stats(self):
+        rets = np.concatenate(self.trade_rets) if self.trade_rets else np.zeros(0)
+        gains, losses = rets[rets > 0].sum(), -rets[rets < 0].sum()
+        return {
+            "trades": int(len(rets)),
+            "win_rate": float((rets > 0).mean()) if len(rets) else 0.0,
+            "total_return": float(np.mean(self.returns)) if self.returns else 0.0,
+            "worst_return": float(np.min(self.returns)) if self.returns else 0.0,
+            "max_drawdown": self.drawdown,
+            "profit_factor": float(gains / losses) if losses else float("inf") if gains else 0.0,
+        }
+
+
+def sweep(frames, params, metric="total_return", workers=MAX_WORKERS, sl_pct=0.01, tp_pct=0.02,
+          fee=0.0, allow_short=True):
+    """
+    Backtest every parameter set in `params` (from grid() / sample()) on every frame in
+    `frames` ({symbol: OHLCV DataFrame}) and return a table ranked by `metric`.
+    total_return is averaged across symbols; trades / win_rate / profit_factor pool all trades;
+    max_drawdown is the worst of any symbol.
+    Parameter sets sharing indicator windows are scored together; groups run on a process pool.
+    """
+    params = [p for p in params if p]
+    families = {sym: Families(df, params) for sym, df in frames.items()}
+    exits = {"sl_pct": sl_pct, "tp_pct": tp_pct, "fee": fee, "allow_short": allow_short}
+
+    groups = {}
+    for p in params:
+        groups.setdefault(tuple(p[k] for k in WINDOW_KEYS), []).append(
+            {k: v for k, v in p.items() if k not in WINDOW_KEYS})
+    groups = list(groups.items())
+
+    start = time.monotonic()
+    if workers <= 1 or len(groups) == 1:
+        _init(families, exits)
+        rows = [row for g in groups for row in _evaluate(g)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init,
+                                 initargs=(families, exits)) as pool:
+            rows = [row for res in pool.map(_evaluate, groups) for row in res]
+    elapsed = time.monotonic() - start
+    print(f"✅ Swept {len(params)} parameter sets x {len(frames)} symbols in {elapsed:.1f}s")
+
+    table = pd.DataFrame(rows)
+    if table.empty:
+        return table
+    return table.sort_values(metric, ascending=False, kind="stable").reset_index(drop=True)
+
+
+# a coarse default search space around hybrid_signal's settings
+SPACE = {
+    "ema_fast": [8, 10, 12, 16],
+    "ema_slow": [21, 26, 34, 50],
+    "macd_signal": [7, 9, 12],
+    "sma_fast": [5, 9, 13],
+    "sma_slow": [21, 34, 50],
+    "rsi_com": [9, 13, 20],
+    "bb_window": [20, 30],
+    "bb_k": [1.5, 2.0, 2.5],
+    "w_trend": [0.2, 0.3, 0.4],
+    "w_sma": [0.1, 0.2, 0.3],
+    "w_macd": [0.1, 0.15, 0.2],
+    "w_rsi": [0.05, 0.1, 0.2],
+    "threshold": [0.2, 0.25, 0.3, 0.35],
+}
+
+if __name__ == "__main__":
+    # python sweep.py candles/*.csv [--samples N] [--workers N] [--top N]
+    import argparse
+    parser = argparse.ArgumentParser(description="Parameter sweep over hybrid_signal")
+    parser.add_argument("files", nargs="+", help="CSV files: time, open, high, low, close[, volume]")
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--metric", default="total_return")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--out", help="write the full ranked table to this CSV")
+    args = parser.parse_args()
+
+    data = {os.path.splitext(os.path.basename(f))[0]:
+            pd.read_csv(f, parse_dates=["time"]).set_index("time") for f in args.files}
+    table = sweep(data, sample(SPACE, args.samples, args.seed), args.metric, args.workers)
+    print(table.head(args.top).to_string())
+    if args.out:
+        table.to_csv(args.out, index=False)
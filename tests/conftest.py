@@ -0,0 +1,78 @@
+# tests/conftest.py
+import os
+import sys
+import itertools
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeDocument:
+    def __init__(self, collection, doc_id):
+        self.collection = collection
+        self.id = doc_id
+
+    def set(self, data):
+        self.collection.docs[self.id] = dict(data)
+
+    def get(self):
+        self.collection.db.reads += 1
+        return FakeSnapshot(self.id, self.collection.docs.get(self.id))
+
+    def delete(self):
+        self.collection.docs.pop(self.id, None)
+
+
+class FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return self._data
+
+
+class FakeCollection:
+    def __init__(self, db):
+        self.db = db
+        self.docs = {}
+
+    def document(self, doc_id=None):
+        return FakeDocument(self, doc_id or f"doc{next(self.db.ids):06d}")
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, ref, data):
+        self.writes.append((ref, data))
+
+    def commit(self):
+        for ref, data in self.writes:
+            ref.set(data)
+        self.db.commits.append(len(self.writes))
+
+
+class FakeFirestore:
+    """In-memory stand-in for the parts of firestore.Client the writers use."""
+
+    def __init__(self):
+        self.ids = itertools.count()
+        self.collections = {}
+        self.commits = []  # docs per batch commit
+        self.reads = 0
+
+    def collection(self, name):
+        return self.collections.setdefault(name, FakeCollection(self))
+
+    def batch(self):
+        return FakeBatch(self)
+
+
+@pytest.fixture
+def fake_db():
+    return FakeFirestore()
@@ -0,0 +1,42 @@
+# tests/synthetic.py
+"""Synthetic candles and signal comparison shared by the equivalence tests."""
+import math
+
+import numpy as np
+import pandas as pd
+
+
+def candles(n=300, seed=0, start="2024-01-01", freq="5min"):
+    """Random-walk OHLCV frame indexed by time, with trends both ways and volume spikes."""
+    rng = np.random.default_rng(seed)
+    drift = np.repeat(rng.normal(0, 0.004, n // 25 + 1), 25)[:n]
+    close = 100 * np.exp(np.cumsum(drift + rng.normal(0, 0.006, n)))
+    volume = rng.lognormal(3, 0.6, n) * np.where(rng.random(n) < 0.05, 4, 1)
+    return pd.DataFrame({
+        "open": close * (1 + rng.normal(0, 0.001, n)),
+        "high": close * 1.002,
+        "low": close * 0.998,
+        "close": close,
+        "volume": volume,
+    }, index=pd.date_range(start, periods=n, freq=freq))
+
+
+def _same(a, b, rel):
+    if isinstance(a, float) or isinstance(b, float):
+        a, b = float(a), float(b)
+        return (math.isnan(a) and math.isnan(b)) or math.isclose(a, b, rel_tol=rel, abs_tol=rel)
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(_same(x, y, rel) for x, y in zip(a, b))
+    return a == b
+
+
+def assert_same_signal(got, want, rel=1e-9):
+    """hybrid_signal dicts agree: signal, confidence, reasons and meta (bar the timestamp)."""
+    assert got["signal"] == want["signal"]
+    assert got["reasons"] == want["reasons"]
+    assert math.isclose(got["confidence"], want["confidence"], abs_tol=1e-9)
+    meta = {k: v for k, v in got["meta"].items() if k != "timestamp"}
+    expected = {k: v for k, v in want["meta"].items() if k != "timestamp"}
+    assert meta.keys() == expected.keys()
+    for k in meta:
+        assert _same(meta[k], expected[k], rel), (k, meta[k], expected[k])
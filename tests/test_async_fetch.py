@@ -0,0 +1,27 @@
+# tests/test_async_fetch.py
+import asyncio
+import time
+
+import pytest
+
+from async_fetch import TokenBucket
+
+
+def test_acquire_waits_for_refill():
+    async def run():
+        bucket = TokenBucket(rate=100.0, capacity=5)
+        start = time.monotonic()
+        await bucket.acquire(5)
+        await bucket.acquire(5)
+        return time.monotonic() - start
+    assert asyncio.run(run()) >= 0.04
+
+
+def test_weight_above_capacity_raises_instead_of_blocking():
+    async def run():
+        bucket = TokenBucket(rate=1.0, capacity=5)
+        with pytest.raises(ValueError):
+            await asyncio.wait_for(bucket.acquire(10), 1.0)
+        # the lock was never taken: other fetches still go through
+        await asyncio.wait_for(bucket.acquire(1), 1.0)
+    asyncio.run(run())
@@ -0,0 +1,58 @@
+# tests/test_auth.py
+import types
+
+import pytest
+
+pytest.importorskip("firebase_admin")
+
+import auth  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr("cache.time", types.SimpleNamespace(monotonic=c.monotonic))
+    auth._key_cache.clear()
+    yield c
+    auth._key_cache.clear()
+
+
+def test_hit_is_cached(fake_db, clock):
+    auth.save_key_to_db("k1", "owner", db=fake_db)
+    assert auth.validate_key("k1", db=fake_db)["role"] == "owner"
+    assert auth.validate_key("k1", db=fake_db)["valid"]
+    assert fake_db.reads == 1
+
+
+def test_miss_is_cached_for_the_negative_ttl(fake_db, clock):
+    assert auth.validate_key("new", db=fake_db) == {"valid": False}
+    # created by another process: not seen until the cached miss expires
+    fake_db.collection("keys").document(auth.hash_key("new")).set({"role": "user"})
+    clock.now += auth.KEY_NEGATIVE_TTL - 1
+    assert auth.validate_key("new", db=fake_db) == {"valid": False}
+    assert fake_db.reads == 1
+    clock.now += 2
+    assert auth.validate_key("new", db=fake_db)["valid"]
+    assert fake_db.reads == 2
+
+
+def test_save_invalidates_a_cached_miss(fake_db, clock):
+    assert not auth.validate_key("k2", db=fake_db)["valid"]
+    auth.save_key_to_db("k2", db=fake_db)
+    assert auth.validate_key("k2", db=fake_db)["valid"]
+
+
+def test_delete_invalidates_a_cached_hit(fake_db, clock):
+    auth.save_key_to_db("k3", db=fake_db)
+    assert auth.validate_key("k3", db=fake_db)["valid"]
+    auth.delete_key_from_db("k3", db=fake_db)
+    assert auth.validate_key("k3", db=fake_db) == {"valid": False}
+
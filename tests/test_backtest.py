@@ -0,0 +1,26 @@
+# tests/test_backtest.py
+import math
+
+import pytest
+
+from backtest import bar_signals
+from panel import SIGNAL_LABELS, reason_strings
+from signals import hybrid_signal
+from synthetic import candles
+
+
+@pytest.mark.parametrize("volume", [True, False])
+@pytest.mark.parametrize("seed", [3, 4])
+def test_every_bar_matches_hybrid_signal_on_the_prefix(seed, volume):
+    df = candles(160, seed=seed)
+    if not volume:
+        df = df.drop(columns="volume")
+    bars = bar_signals(df)
+    assert bars.index.equals(df.index)
+    for i in range(len(df)):
+        want = hybrid_signal(df.iloc[:i + 1])
+        got = bars.iloc[i]
+        rsi = want["meta"].get("rsi", 50.0)
+        assert SIGNAL_LABELS[int(got["signal"])] == want["signal"], i
+        assert math.isclose(got["confidence"], want["confidence"], abs_tol=1e-4), i
+        assert reason_strings(int(got["reasons"]), rsi) == want["reasons"], i
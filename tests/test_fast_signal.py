@@ -0,0 +1,28 @@
+# tests/test_fast_signal.py
+import pytest
+
+from fast_signal import fast_signal, frame_signal, tail_length
+from signals import hybrid_signal
+from synthetic import candles, assert_same_signal
+
+
+@pytest.mark.parametrize("n", [3, 6, 21, 40, 150, tail_length() + 200])
+@pytest.mark.parametrize("seed", range(4))
+def test_matches_hybrid_signal(n, seed):
+    df = candles(n, seed=seed)
+    res = fast_signal(df["close"].to_numpy(), df["volume"].to_numpy())
+    assert_same_signal(res.to_dict(), hybrid_signal(df), rel=1e-7)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_matches_hybrid_signal_without_volume(seed):
+    df = candles(150, seed=seed).drop(columns="volume")
+    assert_same_signal(fast_signal(df["close"].to_numpy()).to_dict(), hybrid_signal(df),
+                       rel=1e-7)
+
+
+def test_score_and_confidence_agree():
+    df = candles(300, seed=9)
+    res = frame_signal(df)
+    assert res.confidence == pytest.approx(max(0.0, min(1.0, (res.score + 1) / 2)))
+    assert res.label == hybrid_signal(df)["signal"]
@@ -0,0 +1,59 @@
+# tests/test_fcm.py
+import types
+
+from fcm import TokenRegistry
+
+
+def doc(uid, token):
+    return types.SimpleNamespace(id=uid, to_dict=lambda: {"fcmToken": token} if token else {})
+
+
+def change(kind, d):
+    return types.SimpleNamespace(type=types.SimpleNamespace(name=kind), document=d)
+
+
+class FakeUsers:
+    """users collection whose listener only fires when the test says so."""
+
+    def __init__(self, docs, fire_at_once=False):
+        self.docs = docs
+        self.fire_at_once = fire_at_once
+        self.callback = None
+        self.reads = 0
+
+    def collection(self, name):
+        return self
+
+    def on_snapshot(self, callback):
+        self.callback = callback
+        if self.fire_at_once:
+            self.fire()
+        return types.SimpleNamespace(unsubscribe=lambda: None)
+
+    def get(self):
+        self.reads += 1
+        return list(self.docs)
+
+    def fire(self, changes=None):
+        self.callback(list(self.docs), changes or [], None)
+
+
+def test_first_snapshot_is_the_load():
+    users = FakeUsers([doc("u1", "t1"), doc("u2", None)], fire_at_once=True)
+    registry = TokenRegistry(users).start(wait=1.0)
+    assert registry.tokens() == ["t1"]
+    assert users.reads == 0
+
+
+def test_slow_snapshot_falls_back_to_one_read():
+    users = FakeUsers([doc("u1", "t1"), doc("u2", "t2")])
+    registry = TokenRegistry(users).start(wait=0.01)
+    assert sorted(registry.tokens()) == ["t1", "t2"]
+    assert users.reads == 1
+
+    # the late first snapshot replaces the fallback load, later ones apply their changes
+    users.docs = [doc("u2", "t2")]
+    users.fire()
+    assert registry.tokens() == ["t2"]
+    users.fire([change("ADDED", doc("u3", "t3")), change("REMOVED", doc("u2", None))])
+    assert registry.tokens() == ["t3"]
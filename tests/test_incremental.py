@@ -0,0 +1,67 @@
+# tests/test_incremental.py
+import numpy as np
+import pytest
+
+from incremental import IndicatorEngine, IndicatorState
+from signals import add_indicators, hybrid_signal
+from synthetic import candles, assert_same_signal
+
+COLUMNS = ["ema_fast", "ema_slow", "sma9", "sma21", "rsi", "macd", "macd_signal",
+           "bb_mid", "bb_std", "bb_upper", "bb_lower", "vol_sma"]
+
+
+def with_gaps(df):
+    df = df.copy()
+    df.iloc[[0, 30, 31, 32, 120], df.columns.get_loc("close")] = np.nan
+    df.iloc[[5, 60, 61, 200], df.columns.get_loc("volume")] = np.nan
+    return df
+
+
+def assert_rows_match(row, ref):
+    for col in COLUMNS:
+        np.testing.assert_allclose(row[col], ref[col], rtol=1e-9, atol=1e-9, err_msg=col)
+
+
+@pytest.mark.parametrize("gaps", [False, True])
+def test_every_bar_matches_add_indicators(gaps):
+    df = candles(300, seed=1)
+    if gaps:
+        df = with_gaps(df)
+    ref = add_indicators(df)
+    state = IndicatorState(history=150)
+    for i, (t, bar) in enumerate(df.iterrows()):
+        row = state.update(t, bar["close"], bar["volume"])
+        assert_rows_match(row, ref.iloc[i])
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("gaps", [False, True])
+def test_engine_cycles_match_hybrid_signal(seed, gaps):
+    # each cycle fetches an overlapping window whose last bar is still forming, as the worker
+    # does; the engine's signal must equal hybrid_signal over every bar it has seen so far
+    full = candles(400, seed=seed)
+    if gaps:
+        full = with_gaps(full)
+    engine = IndicatorEngine(history=150)
+    first = 30
+    for end in range(first + 120, len(full) + 1, 11):
+        forming = full.iloc[end - 120:end].copy()
+        forming.iloc[-1, forming.columns.get_loc("close")] *= 1.001
+        engine.sync("BTC", "5m", forming)
+        state = engine.sync("BTC", "5m", full.iloc[end - 120:end])
+        seen = full.iloc[first:end]
+        assert_rows_match(state.last_rows()[1], add_indicators(seen).iloc[-1])
+        assert_same_signal(hybrid_signal(state), hybrid_signal(seen))
+
+
+def test_resync_after_many_steps_keeps_matching():
+    df = candles(3000, seed=7)
+    state = IndicatorState.from_frame(df)
+    assert_rows_match(state.last_rows()[1], add_indicators(df).iloc[-1])
+
+
+def test_older_candle_is_rejected():
+    df = candles(10)
+    state = IndicatorState.from_frame(df)
+    with pytest.raises(ValueError):
+        state.update(df.index[3], 1.0, 1.0)
@@ -0,0 +1,58 @@
+# tests/test_main.py
+import pytest
+
+import firebase_app
+
+
+@pytest.fixture
+def client(fake_db, monkeypatch):
+    monkeypatch.setattr(firebase_app, "_client", fake_db)
+    import main
+    published = []
+    monkeypatch.setattr(main.notifier, "publish", published.append)
+    main.app.config["TESTING"] = True
+    with main.app.test_client() as c:
+        c.published = published
+        yield c
+
+
+def test_add_signals_reports_errors_per_item(client, fake_db):
+    items = [
+        {"symbol": "BTC-USD", "signal": "BUY"},
+        {"signal": "SELL"},
+        "not a dict",
+        {"symbol": "ETH-USD", "signal": "HOLD"},
+    ]
+    res = client.post("/add-signals", json=items)
+    assert res.status_code == 200
+    body = res.get_json()
+    assert body["success"] is True
+    assert body["errors"] == [{"index": 1, "error": "invalid data"},
+                              {"index": 2, "error": "invalid data"}]
+    stored = fake_db.collection("signals").docs
+    assert [stored[i]["symbol"] for i in body["ids"]] == ["BTC-USD", "ETH-USD"]
+    assert all("timestamp" in stored[i] for i in body["ids"])
+    assert [s["symbol"] for s in client.published] == ["BTC-USD", "ETH-USD"]
+
+
+def test_add_signals_accepts_wrapped_list(client, fake_db):
+    res = client.post("/add-signals", json={"signals": [{"symbol": "SOL-USD"}]})
+    assert res.status_code == 200
+    assert len(res.get_json()["ids"]) == 1
+
+
+@pytest.mark.parametrize("payload", [[], {"signals": "x"}, {"symbol": "BTC-USD"}])
+def test_add_signals_rejects_non_list(client, payload):
+    assert client.post("/add-signals", json=payload).status_code == 400
+
+
+def test_signals_rejects_unknown_cursor(client):
+    res = client.get("/signals?cursor=gone")
+    assert res.status_code == 400
+    assert res.get_json() == {"error": "invalid cursor"}
+
+
+def test_cors_exposes_paging_headers(client):
+    res = client.get("/", headers={"Origin": "https://example.com"})
+    exposed = {h.strip() for h in res.headers["Access-Control-Expose-Headers"].split(",")}
+    assert {"X-Next-Cursor", "ETag"} <= exposed
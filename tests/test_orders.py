@@ -0,0 +1,174 @@
+# tests/test_orders.py
+import threading
+
+import pytest
+
+from brokers import BrokerRejected
+from orders import OrderDispatcher, DuplicateOrder
+
+CREDS = {"api_key": "k", "access_token": "t"}
+
+
+class ConnectTimeout(Exception):
+    """Named like requests' error: the connection was never made."""
+
+
+class FakeBroker:
+    """place_fn that records calls and raises the queued errors first."""
+
+    def __init__(self, errors=()):
+        self.calls = []
+        self.errors = list(errors)
+        self.lock = threading.Lock()
+
+    def __call__(self, broker, creds, payload):
+        with self.lock:
+            self.calls.append(payload)
+            if self.errors:
+                raise self.errors.pop(0)
+        return {"order_id": f"id-{payload['n']}"}
+
+
+class FakeKeys:
+    def __init__(self, taken=()):
+        self.taken = set(taken)
+
+    def claim(self, key):
+        if key in self.taken:
+            return False
+        self.taken.add(key)
+        return True
+
+    def release(self, key):
+        self.taken.discard(key)
+
+
+@pytest.fixture
+def dispatcher():
+    made = []
+
+    def make(**kwargs):
+        d = OrderDispatcher(**kwargs)
+        made.append(d)
+        return d
+    yield make
+    for d in made:
+        d.close()
+
+
+def test_resubmitting_a_key_returns_the_same_future(dispatcher):
+    broker = FakeBroker()
+    d = dispatcher(place_fn=broker)
+    first = d.submit("u1", "zerodha", CREDS, {"n": 1}, signal_time=1700000000)
+    again = d.submit("u1", "Zerodha", CREDS, {"n": 1}, signal_time=1700000000)
+    assert again is first
+    assert first.result(5)["order_id"] == "id-1"
+    assert broker.calls == [{"n": 1}]
+
+
+def test_pre_connect_errors_are_retried(dispatcher):
+    broker = FakeBroker([ConnectTimeout("connect timed out")])
+    d = dispatcher(place_fn=broker, retries=2)
+    res = d.submit("u1", "zerodha", CREDS, {"n": 1}, idempotency_key="a").result(5)
+    assert res["attempts"] == 2
+    assert len(broker.calls) == 2
+
+
+def test_ambiguous_errors_are_not_retried_and_keep_the_key(dispatcher):
+    broker = FakeBroker([ConnectionResetError("reset by peer")])
+    keys = FakeKeys()
+    d = dispatcher(place_fn=broker, keys=keys)
+    fut = d.submit("u1", "zerodha", CREDS, {"n": 1}, idempotency_key="a")
+    with pytest.raises(ConnectionResetError):
+        fut.result(5)
+    assert len(broker.calls) == 1
+    assert d.submit("u1", "zerodha", CREDS, {"n": 1}, idempotency_key="a") is fut
+    assert "a" in keys.taken
+
+
+def test_rejected_orders_release_the_key(dispatcher):
+    broker = FakeBroker([BrokerRejected("not connected")])
+    keys = FakeKeys()
+    d = dispatcher(place_fn=broker, keys=keys)
+    fut = d.submit("u1", "zerodha", CREDS, {"n": 1}, idempotency_key="a")
+    with pytest.raises(BrokerRejected):
+        fut.result(5)
+    assert "a" not in keys.taken
+    again = d.submit("u1", "zerodha", CREDS, {"n": 1}, idempotency_key="a")
+    assert again is not fut
+    assert again.result(5)["order_id"] == "id-1"
+    assert len(broker.calls) == 2
+
+
+def test_key_claimed_elsewhere_is_a_duplicate(dispatcher):
+    broker = FakeBroker()
+    d = dispatcher(place_fn=broker, keys=FakeKeys({"a"}))
+    with pytest.raises(DuplicateOrder):
+        d.submit("u1", "zerodha", CREDS, {"n": 1}, idempotency_key="a").result(5)
+    assert broker.calls == []
+
+
+def test_order_key_needs_a_signal_time(dispatcher):
+    d = dispatcher(place_fn=FakeBroker())
+    with pytest.raises(ValueError):
+        d.submit("u1", "zerodha", CREDS, {"n": 1})
+
+
+def test_one_worker_places_a_brokers_orders_in_order(dispatcher):
+    broker = FakeBroker()
+    d = dispatcher(place_fn=broker, workers={"zerodha": 1})
+    futures = [d.submit("u1", "zerodha", CREDS, {"n": i}, idempotency_key=str(i))
+               for i in range(20)]
+    for f in futures:
+        f.result(5)
+    assert [p["n"] for p in broker.calls] == list(range(20))
+
+
+class BlockingBroker(FakeBroker):
+    """Holds the first order until released, so the following ones queue up behind it."""
+
+    def __init__(self):
+        super().__init__()
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, broker, creds, payload):
+        if not self.entered.is_set():
+            self.entered.set()
+            self.release.wait(5)
+        return super().__call__(broker, creds, payload)
+
+
+def _queue_behind_first(d, broker, n):
+    futures = [d.submit("u1", "zerodha", CREDS, {"n": 0}, idempotency_key="0")]
+    assert broker.entered.wait(5)
+    futures += [d.submit("u1", "zerodha", CREDS, {"n": i}, idempotency_key=str(i))
+                for i in range(1, n)]
+    broker.release.set()
+    return futures
+
+
+def test_queued_orders_of_one_account_go_out_as_a_batch(dispatcher):
+    broker = BlockingBroker()
+    batches = []
+
+    def batch_fn(creds, payloads):
+        batches.append([p["n"] for p in payloads])
+        return [{"order_id": f"b-{p['n']}"} for p in payloads]
+
+    d = dispatcher(place_fn=broker, batch_fns={"zerodha": batch_fn}, workers={"zerodha": 1})
+    futures = _queue_behind_first(d, broker, 4)
+    assert [f.result(5)["order_id"] for f in futures] == ["id-0", "b-1", "b-2", "b-3"]
+    assert batches == [[1, 2, 3]]
+
+
+def test_orders_missing_from_a_short_batch_result_fail(dispatcher):
+    broker = BlockingBroker()
+    d = dispatcher(place_fn=broker, workers={"zerodha": 1},
+                   batch_fns={"zerodha": lambda creds, payloads: [{"order_id": "b"}]})
+    futures = _queue_behind_first(d, broker, 3)
+    assert futures[1].result(5)["order_id"] == "b"
+    with pytest.raises(RuntimeError, match="1 results for 2 orders"):
+        futures[2].result(5)
+    # it may have been placed: the key stays taken
+    assert d.submit("u1", "zerodha", CREDS, {"n": 2}, idempotency_key="2") is futures[2]
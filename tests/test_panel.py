@@ -0,0 +1,52 @@
+# tests/test_panel.py
+import numpy as np
+import pytest
+
+from panel import score_frames, score_panel, stack_frames
+from signals import hybrid_signal
+from synthetic import candles, assert_same_signal
+
+SYMBOLS = ["BTC-USD", "ETH-USD", "SOL-USD", "XRP-USD"]
+TIMEFRAMES = ["5m", "1h"]
+
+
+def frames(seed=0):
+    # different lengths per cell, so the panel pads the shorter series
+    lengths = [150, 40, 3, 120, 25, 149, 5, 90]
+    out = {}
+    for k, (sym, tf) in enumerate((s, t) for s in SYMBOLS for t in TIMEFRAMES):
+        out[(sym, tf)] = candles(lengths[k], seed=seed * 10 + k)
+    return out
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_score_frames_matches_hybrid_signal_per_symbol(seed):
+    data = frames(seed)
+    got = score_frames(data, SYMBOLS, TIMEFRAMES)
+    for (sym, tf), df in data.items():
+        assert_same_signal(got[sym][tf], hybrid_signal(df), rel=1e-7)
+
+
+def test_labels_match_hybrid_signal():
+    data = frames(5)
+    res = score_panel(stack_frames(data, SYMBOLS, TIMEFRAMES))
+    labels = res.labels()
+    for i, sym in enumerate(SYMBOLS):
+        for j, tf in enumerate(TIMEFRAMES):
+            assert labels[i][j] == hybrid_signal(data[(sym, tf)])["signal"]
+
+
+def test_missing_cell_is_insufficient_data():
+    data = frames(1)
+    del data[("ETH-USD", "1h")]
+    got = score_frames(data, SYMBOLS, TIMEFRAMES)
+    assert got["ETH-USD"]["1h"]["reasons"] == ["insufficient_data"]
+    assert_same_signal(got["ETH-USD"]["5m"], hybrid_signal(data[("ETH-USD", "5m")]), rel=1e-7)
+
+
+def test_stack_frames_left_pads_with_nan():
+    data = {("A", "5m"): candles(3), ("B", "5m"): candles(6)}
+    panel = stack_frames(data, ["A", "B"], ["5m"])
+    assert panel.shape == (2, 1, 6, 5)
+    assert np.isnan(panel[0, 0, :3]).all()
+    np.testing.assert_array_equal(panel[0, 0, 3:, 3], data[("A", "5m")]["close"].to_numpy())
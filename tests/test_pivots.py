@@ -0,0 +1,59 @@
+# tests/test_pivots.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from pivots import batch_levels, cluster_levels, levels_from_closes, pivot_masks
+
+
+def loop_levels(close, lookback=120):
+    # signals._support_resistance before pivots.py, kept here as the reference
+    closes = close.iloc[-lookback:]
+    if len(closes) < 5:
+        return [float(closes.min())], [float(closes.max())]
+    highs = closes.rolling(5, center=True).apply(lambda x: 1 if x[2] == x.max() else 0, raw=True)
+    lows = closes.rolling(5, center=True).apply(lambda x: 1 if x[2] == x.min() else 0, raw=True)
+    supports = list(closes[lows == 1].round(4).unique())[-3:]
+    resistances = list(closes[highs == 1].round(4).unique())[-3:]
+    if not supports:
+        supports = [round(float(closes.min()), 4)]
+    if not resistances:
+        resistances = [round(float(closes.max()), 4)]
+    return supports, resistances
+
+
+def series(kind, n, seed):
+    rng = np.random.default_rng(seed)
+    if kind == "walk":
+        return pd.Series(100 + rng.normal(0, 1, n).cumsum())
+    if kind == "plateaus":
+        # few distinct prices: ties inside windows and repeated levels
+        return pd.Series(rng.integers(0, 4, n).astype(float) + 100)
+    if kind == "trend":
+        return pd.Series(np.arange(n, dtype=float))
+    return pd.Series(100 + rng.normal(0, 1, n).cumsum()).where(rng.random(n) > 0.05)
+
+
+@pytest.mark.parametrize("kind", ["walk", "plateaus", "trend", "gaps"])
+@pytest.mark.parametrize("n", [1, 4, 5, 7, 60, 120, 300])
+@pytest.mark.parametrize("seed", range(3))
+def test_levels_match_the_rolling_apply_loop(kind, n, seed):
+    close = series(kind, n, seed)
+    assert levels_from_closes(close) == loop_levels(close)
+
+
+def test_batch_levels_match_one_by_one():
+    closes = [series(kind, n, seed).to_numpy()
+              for kind in ("walk", "plateaus", "gaps") for n in (3, 50, 200) for seed in range(2)]
+    assert batch_levels(closes) == [levels_from_closes(c) for c in closes]
+
+
+def test_pivot_window_must_be_odd():
+    with pytest.raises(ValueError):
+        pivot_masks(np.arange(10.0), window=4)
+
+
+def test_cluster_levels_merge_nearby_prices():
+    prices = [100.0, 100.1, 105.0, 100.05, 110.0]
+    # 100.0 / 100.05 / 100.1 are one level; ordered by when each level was last touched
+    assert cluster_levels(prices, tolerance=0.002) == [105.0, 100.05, 110.0]
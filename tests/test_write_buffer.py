@@ -0,0 +1,86 @@
+# tests/test_write_buffer.py
+import time
+import threading
+
+from write_buffer import commit_batched, WriteBuffer
+
+
+def test_commit_batched_splits_into_500_doc_commits(fake_db):
+    docs = [{"n": i} for i in range(1203)]
+    ids = commit_batched(fake_db, "signals", docs)
+    assert fake_db.commits == [500, 500, 203]
+    stored = fake_db.collection("signals").docs
+    assert [stored[i]["n"] for i in ids] == list(range(1203))
+
+
+def test_commit_batched_empty(fake_db):
+    assert commit_batched(fake_db, "signals", []) == []
+    assert fake_db.commits == []
+
+
+class Recorder:
+    def __init__(self, fail=0):
+        self.batches = []
+        self.fail = fail
+        self.called = threading.Event()
+
+    def __call__(self, items):
+        self.called.set()
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("boom")
+        self.batches.append(list(items))
+        return len(items)
+
+
+def test_flushes_at_flush_size():
+    sink = Recorder()
+    buf = WriteBuffer(sink, flush_size=3, flush_interval=0)
+    buf.add(1)
+    buf.add(2)
+    assert sink.batches == [] and len(buf) == 2
+    buf.add(3)
+    assert sink.batches == [[1, 2, 3]] and len(buf) == 0
+
+
+def test_flushes_after_flush_interval():
+    sink = Recorder()
+    buf = WriteBuffer(sink, flush_size=100, flush_interval=0.1)
+    buf.add("a")
+    buf.add("b")
+    assert sink.called.wait(2.0)
+    deadline = time.monotonic() + 2.0
+    while not sink.batches and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sink.batches == [["a", "b"]]
+    buf.close()
+
+
+def test_failed_flush_requeues_items():
+    sink = Recorder(fail=1)
+    buf = WriteBuffer(sink, flush_size=100, flush_interval=0)
+    buf.add(1)
+    buf.add(2)
+    assert buf.flush() is None
+    assert len(buf) == 2
+    buf.add(3)
+    assert buf.flush() == 3
+    assert sink.batches == [[1, 2, 3]]
+
+
+def test_requeue_is_capped_at_max_pending():
+    sink = Recorder(fail=1)
+    buf = WriteBuffer(sink, flush_size=100, flush_interval=0, max_pending=3)
+    for i in range(5):
+        buf.add(i)
+    buf.flush()
+    # the oldest items are dropped first
+    assert buf._items == [2, 3, 4]
+
+
+def test_close_flushes_what_is_left():
+    sink = Recorder()
+    buf = WriteBuffer(sink, flush_size=100, flush_interval=5.0)
+    buf.add(1)
+    buf.close()
+    assert sink.batches == [[1]]
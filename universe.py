@@ -0,0 +1,109 @@
+# universe.py
+"""
+The symbol universe (symbols.json) and how it is split across worker nodes and processes.
+
+Work is assigned with rendezvous (highest random weight) hashing: every key goes to the
+bucket with the largest hash(key, bucket). Assignment is deterministic on every node, needs
+no coordination, and going from N to N+1 buckets moves only the ~1/(N+1) of keys the new
+bucket wins.
+
+    SHARD_COUNT=3 SHARD_INDEX=0 WORKER_PROCESSES=4 python scheduler.py
+"""
+import os
+import json
+import hashlib
+import multiprocessing
+from multiprocessing.connection import wait
+
+from candle_store import timeframe_seconds
+
+UNIVERSE_PATH = os.getenv("SYMBOLS_FILE", "symbols.json")
+# this node and how many there are
+SHARD_INDEX = int(os.getenv("SHARD_INDEX", "0"))
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
+# processes per node the long-running workers split their share over
+PROCESSES = int(os.getenv("WORKER_PROCESSES", "1"))
+
+
+def load(path=UNIVERSE_PATH, categories=None):
+    """symbols.json entries as [{symbol, name, category, intervals}], optionally some categories only."""
+    with open(path) as f:
+        data = json.load(f)
+    return [dict(entry, category=category)
+            for category, entries in data.items()
+            if categories is None or category in categories
+            for entry in entries]
+
+
+def pairs(entries):
+    """[(symbol, interval)] for every interval of every entry."""
+    return [(e["symbol"], tf) for e in entries for tf in e["intervals"]]
+
+
+def pair_key(pair):
+    return f"{pair[0]}|{pair[1]}"
+
+
+def sort_timeframes(tfs):
+    return sorted(set(tfs), key=timeframe_seconds)
+
+
+def ccxt_symbol(symbol, quote="USDT"):
+    """Yahoo-style crypto ticker -> exchange pair: 'BTC-USD' -> 'BTC/USDT'."""
+    return f"{symbol.split('-')[0]}/{quote}"
+
+
+def _weight(key, bucket, salt):
+    return hashlib.blake2b(f"{salt}|{key}|{bucket}".encode(), digest_size=8).digest()
+
+
+def owner(key, count, salt="node"):
+    """Bucket (0..count-1) that owns `key`."""
+    return max(range(count), key=lambda bucket: _weight(key, bucket, salt))
+
+
+def shard(items, index=SHARD_INDEX, count=SHARD_COUNT, key=str, salt="node"):
+    """The items bucket `index` of `count` owns, in their original order."""
+    if count <= 1:
+        return list(items)
+    return [item for item in items if owner(key(item), count, salt) == index]
+
+
+def local(items, proc, procs, key=str):
+    """A process's share of this node's items (hashed independently of the node split)."""
+    return shard(items, proc, procs, key, salt="process")
+
+
+def label(proc=0, procs=1):
+    """Suffix naming this node / process, for per-shard state; empty when nothing is split."""
+    out = f"-{SHARD_INDEX}of{SHARD_COUNT}" if SHARD_COUNT > 1 else ""
+    return out + (f"-p{proc}of{procs}" if procs > 1 else "")
+
+
+def run_processes(target, procs=PROCESSES):
+    """
+    target(proc, procs) in `procs` forked processes, each owning its share of this node's work
+    for its whole life (so per-symbol indicator state stays put). If one exits, the others are
+    stopped and its exit code is returned, so the platform restarts the node as a whole.
+    """
+    if procs <= 1:
+        target(0, 1)
+        return 0
+    ctx = multiprocessing.get_context("fork")
+    children = [ctx.Process(target=target, args=(i, procs), name=f"worker-{i}")
+                for i in range(procs)]
+    for p in children:
+        p.start()
+    first = None
+    try:
+        ready = wait([p.sentinel for p in children])
+        first = next(p for p in children if p.sentinel in ready)
+    finally:
+        for p in children:
+            if p.is_alive():
+                p.terminate()
+        for p in children:
+            p.join()
+    code = first.exitcode if first is not None else 1
+    print(f"🛑 Worker processes stopped ({first.name if first else 'interrupted'}, exit code {code})")
+    return code
@@ -1,44 +1,138 @@
 # worker.py
 import os
-import requests
-import yfinance as yf
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+import universe
 from signals import hybrid_signal
+from panel import score_frames
+from candle_store import yf_fetch, yf_fetch_batch
+from write_buffer import WriteBuffer, http_writer
+from signal_state import SignalState, FileSnapshot, FirestoreSnapshot
+from firebase_app import db  # only touched if the state lives in Firestore
+from metrics import CYCLE_SECONDS, SIGNALS, serve, stage
 
 BACKEND_URL = os.getenv("BACKEND_URL", "https://protrader-backend-sbus.onrender.com")
+YF_THREADS = os.getenv("YF_THREADS", "1") == "1"
+# this is a one-shot job, so the metrics server is off unless a port is given
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
 
-# Define assets and timeframes
-SYMBOLS = [
-    "BTC-USD", "ETH-USD",   # Crypto
-    "AAPL", "TSLA", "MSFT", # Stocks
-    "EURUSD=X", "GBPUSD=X", "USDJPY=X", # Forex
-    "^NSEI"  # Nifty 50
-]
-TIMEFRAMES = ["5m", "15m", "1h", "1d"]
+# last pushed signal per (symbol, interval), kept between runs: only transitions and
+# confidence moves >= SIGNAL_CONFIDENCE_DELTA are pushed. This is a one-shot job and its
+# runners are ephemeral, so the state lives in Firestore (one document per shard) unless
+# SIGNAL_STATE_PATH points at a file that persists between runs
+STATE_PATH = os.getenv("SIGNAL_STATE_PATH")
+state = SignalState(FileSnapshot(STATE_PATH) if STATE_PATH else
+                    FirestoreSnapshot(db, "state", f"worker{universe.label()}"))
+
+def recorded(write):
+    """Flush function wrapper: pushed signals go into `state` only once the write succeeded."""
+    def flush(payloads):
+        res = write(payloads)
+        for p in payloads:
+            state.record(p["symbol"], p["interval"], p["signal"], p["confidence"])
+        return res
+    return flush
+
+# signals go to /add-signals in bulk instead of one POST each; a push that never gets through
+# stays unrecorded, so the next run sends it again
+pushes = WriteBuffer(recorded(http_writer(f"{BACKEND_URL}/add-signals")), flush_size=50,
+                     flush_interval=5.0)
+
+# CPU-bound scoring fans out over this many processes (see score_all)
+SCORE_WORKERS = int(os.getenv("SCORE_WORKERS", str(os.cpu_count() or 1)))
+# symbols per process below which pickling the frames costs more than the pool saves
+POOL_MIN_SYMBOLS = int(os.getenv("POOL_MIN_SYMBOLS", "250"))
+
+# assets and timeframes from symbols.json: this node's (symbol, interval) pairs
+# (SHARD_INDEX of SHARD_COUNT; a single node takes all of them)
+PAIRS = universe.shard(universe.pairs(universe.load()), key=universe.pair_key)
+SYMBOLS = list(dict.fromkeys(sym for sym, _ in PAIRS))
+TIMEFRAMES = universe.sort_timeframes(tf for _, tf in PAIRS)
+
+def yf_download(*args, **kwargs):
+    # yfinance (and the requests / lxml stack under it) is imported on the first download
+    import yfinance as yf
+    return yf.download(*args, **kwargs)
 
 def fetch_data(symbol, interval="5m", limit=120):
+    # cached: only the candles since the last stored bar are downloaded
     try:
-        df = yf.download(tickers=symbol, period="5d", interval=interval)
-        df = df.tail(limit).reset_index()
-        df.rename(columns={
-            "Date": "time",
-            "Open": "open",
-            "High": "high",
-            "Low": "low",
-            "Close": "close",
-            "Volume": "volume"
-        }, inplace=True)
-        return df
+        with stage("fetch"):
+            return yf_fetch(yf_download, symbol, interval, limit=limit, period="5d")
     except Exception as e:
         print(f"⚠️ Failed to fetch {symbol} {interval}: {e}")
         return None
 
+def fetch_batch(symbols, interval="5m", limit=120):
+    """
+    All symbols of one interval in a single yf.download call.
+    Returns {symbol: DataFrame}; failed or empty tickers are logged and left out.
+    """
+    frames = {}
+    with stage("fetch"):
+        fetched = yf_fetch_batch(yf_download, symbols, interval, limit=limit,
+                                 period="5d", threads=YF_THREADS)
+    for sym, df in fetched.items():
+        if isinstance(df, Exception):
+            print(f"⚠️ Failed to fetch {sym} {interval}: {df}")
+        elif df is not None and not df.empty:
+            frames[sym] = df
+    return frames
+
 def run_signal(symbol, interval):
     df = fetch_data(symbol, interval)
     if df is None or df.empty:
         return
 
-    sig = hybrid_signal(df)
+    with stage("score"):
+        sig = hybrid_signal(df)
+    push_signal(symbol, interval, sig)
+
+def score_all(frames, symbols, timeframes, workers=SCORE_WORKERS):
+    """score_frames, with the symbols split over a process pool when each process gets enough."""
+    n = min(workers, len(symbols) // POOL_MIN_SYMBOLS)
+    if n <= 1:
+        return score_frames(frames, symbols, timeframes)
+    parts = [symbols[i::n] for i in range(n)]
+    results = {}
+    with ProcessPoolExecutor(max_workers=n) as pool:
+        jobs = []
+        for part in parts:
+            mine = set(part)
+            jobs.append(pool.submit(score_frames, {k: df for k, df in frames.items() if k[0] in mine},
+                                    part, timeframes))
+        for job in jobs:
+            results.update(job.result())
+    return results
+
+def run_all(symbols=None, timeframes=None, workers=SCORE_WORKERS):
+    """
+    Fetch and score symbols x timeframes, or by default this node's PAIRS.
+    Everything is fetched first (one yf.download per timeframe), then the whole panel is scored.
+    """
+    if symbols is None and timeframes is None:
+        pairs = PAIRS
+    else:
+        pairs = [(sym, tf) for tf in timeframes or TIMEFRAMES for sym in symbols or SYMBOLS]
+    by_tf = {}
+    for sym, tf in pairs:
+        by_tf.setdefault(tf, []).append(sym)
+
+    frames = {}
+    for tf, syms in by_tf.items():
+        for sym, df in fetch_batch(syms, tf).items():
+            frames[(sym, tf)] = df
+
+    symbols = list(dict.fromkeys(sym for sym, _ in pairs))
+    with stage("score"):
+        results = score_all(frames, symbols, list(by_tf), workers)
+    for sym, tf in frames:
+        push_signal(sym, tf, results[sym][tf])
+
+def push_signal(symbol, interval, sig):
+    change = state.check(symbol, interval, sig["signal"], sig["confidence"], record=False)
+    if change is None:
+        return
     payload = {
         "symbol": symbol,
         "interval": interval,
@@ -46,19 +140,18 @@ def run_signal(symbol, interval):
         "confidence": sig["confidence"],
         "reasons": sig["reasons"],
         "last_price": sig["meta"]["last_price"],
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": datetime.utcnow().isoformat(),
+        "change": change
     }
-
-    try:
-        res = requests.post(f"{BACKEND_URL}/add-signal", json=payload)
-        if res.status_code == 200:
-            print(f"✅ {symbol} [{interval}] → {sig['signal']} @ {sig['meta']['last_price']}")
-        else:
-            print("❌ Error pushing signal:", res.text)
-    except Exception as e:
-        print("🔥 Failed to push signal:", e)
+    print(f"📢 {symbol} [{interval}] → {sig['signal']} @ {sig['meta']['last_price']}")
+    pushes.add(payload)
+    SIGNALS.labels(sig["signal"]).inc()
 
 if __name__ == "__main__":
-    for sym in SYMBOLS:
-        for tf in TIMEFRAMES:
-            run_signal(sym, tf)
+    serve(METRICS_PORT)
+    with CYCLE_SECONDS.labels("worker").time():
+        try:
+            run_all()
+        finally:
+            pushes.close()
+            state.close()
@@ -0,0 +1,122 @@
+# write_buffer.py
+import time
+import threading
+
+from metrics import WRITES, stage
+
+FIRESTORE_BATCH_LIMIT = 500  # max writes per Firestore batch commit
+
+
+def chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def commit_batched(db, collection, docs, batch_size=FIRESTORE_BATCH_LIMIT):
+    """
+    Write docs to `collection` with batched commits (one round trip per `batch_size` docs).
+    Document ids are allocated client-side, so they are returned in input order.
+    """
+    ids = []
+    col = db.collection(collection)
+    for chunk in chunks(list(docs), batch_size):
+        batch = db.batch()
+        for doc in chunk:
+            ref = col.document()
+            batch.set(ref, doc)
+            ids.append(ref.id)
+        batch.commit()
+    return ids
+
+
+def firestore_writer(db, collection, batch_size=FIRESTORE_BATCH_LIMIT):
+    """flush function for WriteBuffer that commits into a Firestore collection."""
+    def write(docs):
+        ids = commit_batched(db, collection, docs, batch_size)
+        print(f"💾 Saved {len(ids)} docs to {collection}")
+        return ids
+    return write
+
+
+def http_writer(url, timeout=15):
+    """flush function for WriteBuffer that POSTs the whole list to a bulk endpoint."""
+    def write(payloads):
+        import requests  # on the first flush, not when the worker module is imported
+        res = requests.post(url, json=payloads, timeout=timeout)
+        if res.status_code != 200:
+            raise RuntimeError(f"{res.status_code} {res.text}")
+        print(f"✅ Pushed {len(payloads)} signals")
+        return res.json()
+    return write
+
+
+class WriteBuffer:
+    """
+    Collects writes and hands them to `flush_fn` in bulk: when `flush_size` items are queued,
+    or `flush_interval` seconds after the oldest queued item, whichever comes first.
+    A failed flush keeps its items queued for the next attempt (up to max_pending).
+    Call close() (or flush()) before the process exits.
+    """
+
+    def __init__(self, flush_fn, flush_size=100, flush_interval=2.0, max_pending=10000):
+        self.flush_fn = flush_fn
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._items = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = None
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, item):
+        with self._lock:
+            if not self._items:
+                self._oldest = time.monotonic()
+            self._items.append(item)
+            full = len(self._items) >= self.flush_size
+            if self._thread is None and self.flush_interval:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                items, self._items = self._items, []
+                self._oldest = None
+            if not items:
+                return None
+            try:
+                with stage("persist"):
+                    result = self.flush_fn(items)
+                WRITES.labels("ok").inc(len(items))
+                return result
+            except Exception as e:
+                WRITES.labels("failed").inc(len(items))
+                print(f"⚠️ Flush of {len(items)} writes failed: {e}")
+                with self._lock:
+                    self._items = (items + self._items)[-self.max_pending:]
+                    self._oldest = time.monotonic()
+                return None
+
+    def _run(self):
+        while not self._closed:
+            oldest = self._oldest
+            wait = self.flush_interval if oldest is None else oldest + self.flush_interval - time.monotonic()
+            self._wake.wait(max(wait, 0.05))
+            self._wake.clear()
+            oldest = self._oldest
+            if oldest is not None and time.monotonic() - oldest >= self.flush_interval:
+                self.flush()
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        return self.flush()